@@ -3,6 +3,12 @@ import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import chisquare
+# the @timed functions only record spans inside a profiled run, e.g. in a notebook cell:
+#     with chi.profile_run('chi_squared_analysis'):
+#         chi.check_for_distribution_and_plot(train, test)
+#         chi.chi_square_test(train, test)
+# writes scripts/logs/profiles/chi_squared_analysis-<timestamp>.json and prints the time spent in each function
+from profiling import profile_run, timed
 
 
 logging.basicConfig(
@@ -43,6 +49,7 @@ logger.addHandler(error_handler)
 
 
 
+@timed()
 def check_for_distribution_and_plot(train,test):
     logger.info("check for distribution and plot")
     try:
@@ -73,6 +80,7 @@ def check_for_distribution_and_plot(train,test):
     
     except Exception as e:
         logger.error(f" error while checking for distribution of promo on train and test data set {e}")
+@timed()
 def chi_square_test(train,test):
     logger.info("working on Statistical Test - Chi-Squared Test")
     try:
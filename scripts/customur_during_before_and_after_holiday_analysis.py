@@ -6,6 +6,12 @@ import matplotlib.pyplot as plt
 import seaborn as sns 
 from scipy.stats import f_oneway
 from scipy.stats import chisquare
+# the @timed functions only record spans inside a profiled run, e.g. in a notebook cell:
+#     with bda.profile_run('holiday_analysis'):
+#         bda.create_a_holiday_period(train)
+#         bda.ab_hypotesesi(train)
+# writes scripts/logs/profiles/holiday_analysis-<timestamp>.json and prints the time spent in each function
+from profiling import profile_run, timed
 
 logging.basicConfig(
     level=logging.DEBUG,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
@@ -43,6 +49,7 @@ logger.addHandler(info_handler)
 logger.addHandler(error_handler)
 
 
+@timed()
 def create_a_holiday_period(train):
     logger.info("Create a new column to mark the time periods: before, during, after holidays")
     try:
@@ -79,6 +86,7 @@ def create_a_holiday_period(train):
         plt.show()
     except Exception as e:
         logger.error(f"error while creating the holidayperiod column : {e}")
+@timed()
 def ab_hypotesesi(train):
     logger.info("performing the ab hypotesis test over the before during and after holiday sales distribution")
     try:    
@@ -98,6 +106,7 @@ def ab_hypotesesi(train):
             print("There is no significant difference in sales behavior across the holiday periods. which in before , During and after Holiday ")
     except Exception as e:
         logger.error(f"error while performing ab hypotesesi test")
+@timed()
 def seasonal_holiday_behaviour(train):
     ester_sales_behaviour = train[(train['Holidayperiod'] == 'During Holiday') & (train['StateHoliday'] == 'b') ]
     x_mass_sales_behaviour = train[(train['Holidayperiod'] == 'During Holiday') & (train['StateHoliday'] == 'c') ]
@@ -126,6 +135,7 @@ def seasonal_holiday_behaviour(train):
         print("There is a significant difference in sales behavior across the ester christmas and public holidays ")
     else:
         print("There is no significant difference in sales behavior across the ester christmas and public holidays")
+@timed()
 def corelation_sales_vs_no_of_customers(train):
     logger.info("performing the correlation between the number of customers and sales")
     try:
@@ -138,6 +148,7 @@ def corelation_sales_vs_no_of_customers(train):
         plt.show()
     except Exception as e:
         logger.error(f"Error while performing correlation analysis : {e}")
+@timed()
 def impact_of_promotion_on_number_of_customers_and_sales(train):
     logger.info("The impact of promotion on the number of customers and sales")
     try:
@@ -159,6 +170,7 @@ def impact_of_promotion_on_number_of_customers_and_sales(train):
         promo_impact_on_existing_customers(train)
     except Exception as e:
         logger.error(f"Error while tring to analyze the effect of promo on the number of customers and sales")
+@timed()
 def visualize_promo_effect(avg_customers,avg_sales):
     logger.info("Visualizing the impact of promotion on number of customers and sales")
     try:
@@ -180,6 +192,7 @@ def visualize_promo_effect(avg_customers,avg_sales):
         plt.show()
     except Exception as e:
         logger.error("Error while plotting the promo impact: {e}")
+@timed()
 def promo_impact_on_existing_customers(train):
     logger.info("Impact of promotion on existing customers")
     try:
@@ -197,6 +210,7 @@ def promo_impact_on_existing_customers(train):
         plt.ylabel('Number of sales')
     except Exception as e:
         logger.error(f"Error while performing impact of promo on existing customers: {e}")
+@timed()
 def impact_of_promotion_by_store(train):
     logger.info("Anlayzing the better promotion on specific stores")
     try:
@@ -207,6 +221,7 @@ def impact_of_promotion_by_store(train):
         return grouped
     except Exception as e:
         logger.error(f"error while aggregating: {e}")
+@timed()
 def calculat_customer_and_sales_uplift(grouped):
     logger.info("calcuclating customer and sales uplift")
     try:
@@ -222,6 +237,7 @@ def calculat_customer_and_sales_uplift(grouped):
         return pivot_table
     except Exception as e:
         logger.error(f"Error while calculating uplift : {e}")
+@timed()
 def visualize_uplift(pivot_table):
     logger.info("visualizing the uplif")
     try:
@@ -240,6 +256,7 @@ def visualize_uplift(pivot_table):
         plt.show()
     except Exception as e:
         logger.error(f"Error while trying to visualize uplif: {e}")
+@timed()
 def impact_of_opening_all_week_days(train):
     logger.info("Showing the influence of opening all week days on weekends")
     try:
@@ -304,6 +321,7 @@ def impact_of_opening_all_week_days(train):
         plt.show()
     except Exception as e:
         logger.error(f" Error while showing influence of opening all weekdays : {e}")
+@timed()
 def open_all_week_days(train):
     # Step 1: Filter for weekdays and only include stores that are open
     weekday_stores = train[(train['DayOfWeek'] < 6) & (train['Open'] == 1)]
@@ -318,6 +336,7 @@ def open_all_week_days(train):
     # Display results
     print("Stores open on all weekdays:")
     print(stores_open_all_weekdays)
+@timed()
 def analyze_weekday_closures_and_weekend_sales(train):
     try:
         df = train.copy()
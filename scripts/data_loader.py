@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# binary column caches live next to the raw files in this directory
+CACHE_DIR_NAME = '.cache'
+# bump when write_cache / read_cache change the on-disk layout
+CACHE_FORMAT_VERSION = 1
+
+# every Rossmann file writes dates the same way
+DATE_FORMAT = '%Y-%m-%d'
+
+# Declared column types of the Rossmann files: small ints for ids and flags,
+# categoricals for the short string codes, float32 for the sparse store attributes
+SCHEMAS = {
+    'train': {
+        'Store': 'uint16',
+        'DayOfWeek': 'int8',
+        'Sales': 'int32',
+        'Customers': 'int32',
+        'Open': 'int8',
+        'Promo': 'int8',
+        'StateHoliday': 'category',
+        'SchoolHoliday': 'int8',
+    },
+    'test': {
+        'Id': 'int32',
+        'Store': 'uint16',
+        'DayOfWeek': 'int8',
+        # test.csv has a few stores with an unknown Open flag
+        'Open': 'float32',
+        'Promo': 'int8',
+        'StateHoliday': 'category',
+        'SchoolHoliday': 'int8',
+    },
+    'store': {
+        'Store': 'uint16',
+        'StoreType': 'category',
+        'Assortment': 'category',
+        'CompetitionDistance': 'float32',
+        'CompetitionOpenSinceMonth': 'float32',
+        'CompetitionOpenSinceYear': 'float32',
+        'Promo2': 'int8',
+        'Promo2SinceWeek': 'float32',
+        'Promo2SinceYear': 'float32',
+        'PromoInterval': 'category',
+    },
+}
+
+
+def infer_kind(path):
+    """Guess which Rossmann file `path` is from its name ('train', 'test' or 'store')."""
+    name = os.path.basename(str(path)).lower()
+    for kind in SCHEMAS:
+        if name.startswith(kind):
+            return kind
+    return None
+
+
+def memory_footprint(df):
+    """In-memory size of a DataFrame in bytes, object/category contents included."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def load_rossmann(path, kind=None, columns=None, cache=False):
+    """Read a Rossmann csv with its declared schema.
+
+    `kind` defaults to the file name; unknown files are read with inferred types.
+    `columns` restricts the read to a subset of columns. With `cache=True` the
+    file is read through the memory-mapped column cache (see `load_cached`).
+    """
+    if cache:
+        return load_cached(path, kind, columns)
+    df = pd.read_csv(path, **read_options(path, kind, columns))
+    logger.info(f"Loaded {path}: {len(df)} rows, {memory_footprint(df) / 2**20:.1f} MB in memory")
+    return df
+
+
+def read_options(path, kind=None, columns=None):
+    """pd.read_csv arguments applying the schema of `kind` (default: from the file name)."""
+    schema = SCHEMAS.get(kind or infer_kind(path), {})
+    header = pd.read_csv(path, nrows=0).columns
+    if columns is not None:
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise KeyError(f"Columns {missing} are not in {path}")
+        header = [column for column in header if column in columns]
+
+    dtype = {column: schema[column] for column in header if column in schema}
+    parse_dates = ['Date'] if 'Date' in header else False
+    return dict(usecols=list(header), dtype=dtype, parse_dates=parse_dates,
+                date_format=DATE_FORMAT, low_memory=False)
+
+
+def read_rossmann_chunks(path, kind=None, columns=None, chunksize=100_000):
+    """Typed DataFrames of `chunksize` rows, for files too large to load at once."""
+    return pd.read_csv(path, chunksize=chunksize, **read_options(path, kind, columns))
+
+
+def memory_report(path, kind=None):
+    """Footprint of the typed load next to a plain pd.read_csv of the same file."""
+    typed = memory_footprint(load_rossmann(path, kind))
+    plain = memory_footprint(pd.read_csv(path, low_memory=False))
+    logger.info(f"{path}: {plain / 2**20:.1f} MB untyped, {typed / 2**20:.1f} MB typed ({plain / typed:.1f}x smaller)")
+    return {'untyped_bytes': plain, 'typed_bytes': typed, 'reduction': plain / typed}
+
+
+def dvc_md5(path):
+    """md5 recorded for `path` in its .dvc file, None when the file is not tracked by DVC."""
+    dvc_file = f"{path}.dvc"
+    if not os.path.exists(dvc_file):
+        return None
+    with open(dvc_file) as f:
+        for line in f:
+            line = line.strip().lstrip('- ')
+            if line.startswith('md5:'):
+                return line.split(':', 1)[1].strip()
+    return None
+
+
+def schema_hash(kind):
+    """Short hash of how a file of `kind` is read, so a schema change rebuilds its cache."""
+    spec = {'format': CACHE_FORMAT_VERSION, 'schema': SCHEMAS.get(kind, {}), 'date_format': DATE_FORMAT}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def cache_key(path, kind=None):
+    """DVC md5 of the raw file (or its size and mtime when it is not tracked) and the schema hash."""
+    md5 = dvc_md5(path)
+    if md5 is None:
+        stat = os.stat(path)
+        md5 = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return f"{md5}-{schema_hash(kind or infer_kind(path))}"
+
+
+def cache_path(path, kind=None):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR_NAME, f"{name}-{cache_key(path, kind)}")
+
+
+def write_cache(df, cache):
+    """Store every column of df as its own .npy file plus a json header.
+
+    Categorical and object columns are stored as integer codes with their values in the header.
+    """
+    tmp = f"{cache}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    meta = {'rows': len(df), 'columns': []}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        entry = {'name': column, 'file': f"{i}.npy"}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry['categories'] = values.cat.categories.tolist()
+            values = values.cat.codes
+        elif values.dtype == object:
+            codes, uniques = pd.factorize(values)
+            entry['objects'] = uniques.tolist()
+            values = pd.Series(codes)
+        np.save(os.path.join(tmp, entry['file']), values.to_numpy())
+        meta['columns'].append(entry)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # publish atomically so readers never see a half written cache
+    try:
+        os.rename(tmp, cache)
+    except OSError:
+        # another process published the same version first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def read_cache(cache, columns=None):
+    """DataFrame over memory-mapped column files; pages are only read when touched.
+
+    Arrays are mapped copy-on-write, so in-place edits stay private to the process.
+    """
+    with open(os.path.join(cache, 'meta.json')) as f:
+        meta = json.load(f)
+    data = {}
+    for entry in meta['columns']:
+        if columns is not None and entry['name'] not in columns:
+            continue
+        values = np.load(os.path.join(cache, entry['file']), mmap_mode='c')
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        elif 'objects' in entry:
+            # code -1 (missing) picks the trailing NaN
+            values = np.array(entry['objects'] + [np.nan], dtype=object)[values]
+        data[entry['name']] = values
+    if columns is not None:
+        missing = [column for column in columns if column not in data]
+        if missing:
+            raise KeyError(f"Columns {missing} are not in {cache}")
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached(path, kind=None, columns=None):
+    """Load a Rossmann file from its columnar cache, converting the csv on first use.
+
+    The cache is keyed by the md5 in the file's .dvc entry and by the schema and
+    cache format, so `dvc pull` of a new version or a change of SCHEMAS invalidates it
+    automatically.
+    """
+    cache = cache_path(path, kind)
+    if not os.path.exists(cache):
+        logger.info(f"Building the column cache of {path}")
+        write_cache(load_rossmann(path, kind), cache)
+
+        # drop the caches of older versions of the same file
+        directory = os.path.dirname(cache)
+        prefix = f"{os.path.basename(path)}-"
+        for entry in os.listdir(directory):
+            stale = os.path.join(directory, entry)
+            if entry.startswith(prefix) and stale != cache and '.tmp-' not in entry:
+                shutil.rmtree(stale, ignore_errors=True)
+    df = read_cache(cache, columns)
+    logger.info(f"Loaded {path} from {cache}: {len(df)} rows")
+    return df
@@ -3,6 +3,13 @@ import logging
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
+from data_loader import load_rossmann
+# the @timed functions only record spans inside a profiled run, e.g. in a notebook cell:
+#     with dp.profile_run('dependant_analysis'):
+#         merged_data = dp.load_and_merge_data(store_path, train_path)
+#         dp.impact_of_compution_distance(merged_data)
+# writes scripts/logs/profiles/dependant_analysis-<timestamp>.json and prints the time spent in each function
+from profiling import profile_run, timed
 
 logging.basicConfig(
     level=logging.DEBUG,  # Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
@@ -40,12 +47,13 @@ logger.addHandler(info_handler)
 logger.addHandler(error_handler)
 
 
+@timed()
 def load_and_merge_data(*args):
     logger.info("load and merge data")
     try:
         logger.info("loadding data")
-        store = pd.read_csv(args[0])
-        train = pd.read_csv(args[1])
+        store = load_rossmann(args[0], 'store', cache=True)
+        train = load_rossmann(args[1], 'train', cache=True)
         logger.info("data loaded sucessfully")
 
         # step one merge data
@@ -54,6 +62,7 @@ def load_and_merge_data(*args):
     except Exception as e:
         logger.error(f" error occured : {e}")
         return None
+@timed()
 def assortmnet_analysis(merged_data):
     logger.info("Assortment analysis")
     try:
@@ -72,6 +81,7 @@ def assortmnet_analysis(merged_data):
         return assortmnet_sales
     except Exception as e:
         logger.error(f"Error while analyzing assortment impact on sales: {e}")
+@timed()
 def impote_CompetitionDistance(merged_data):
     logger.info("imputeing the compitition distance with the very big number 100000")
     try:
@@ -84,6 +94,7 @@ def impote_CompetitionDistance(merged_data):
     except Exception as e:
         logger.error(f" error happende : {e}")
 
+@timed()
 def impact_of_compution_distance(merged_data):
     logger.info("Anlayzing the impact of compitetter distance")
     try:
@@ -115,6 +126,7 @@ def impact_of_compution_distance(merged_data):
 
     except Exception as e:
         logger.error(f"error while : {e}")
+@timed()
 def city_center_impact(merged_data):
     logger.info("Analyzing the imapact of compitetor distance when the store is in center city")
     try:
@@ -132,6 +144,7 @@ def city_center_impact(merged_data):
     except Exception as e:
         logger.error(f"error happened while: {e}")
 
+@timed()
 def effect_of_opening_and_reopening_of_competitors_impact(*args):
     store = pd.read_csv(args[0])
     train = pd.read_csv(args[1])
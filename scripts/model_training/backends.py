@@ -0,0 +1,94 @@
+import logging
+import pickle
+import joblib
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+
+def random_forest(**params):
+    return RandomForestRegressor(**{'random_state': 42, **params})
+
+
+def hist_gradient_boosting(**params):
+    # bins every feature into at most 255 buckets, so it trains in a fraction of the forest's time
+    # and the fitted model is a few hundred shallow trees instead of a hundred full-depth ones
+    return HistGradientBoostingRegressor(**{'max_iter': 300, 'random_state': 42, **params})
+
+
+def linear(**params):
+    return Ridge(**params)
+
+
+# name -> factory of the model step, the grid searched by pipeline.main and whether
+# missing values must be imputed first
+BACKENDS = {
+    'random_forest': {
+        'make': random_forest,
+        'param_grid': {
+            'model__n_estimators': [100, 200],
+            'model__max_depth': [None, 10, 20],
+            'model__min_samples_split': [2, 5, 10],
+        },
+    },
+    'hist_gradient_boosting': {
+        'make': hist_gradient_boosting,
+        'param_grid': {
+            'model__learning_rate': [0.05, 0.1, 0.2],
+            'model__max_leaf_nodes': [31, 63, 127],
+            'model__min_samples_leaf': [20, 50],
+        },
+    },
+    'linear': {
+        'make': linear,
+        # DaysAfterHoliday is NaN before the first holiday, the trees handle that natively
+        'impute': True,
+        'param_grid': {
+            'model__alpha': [0.1, 1.0, 10.0],
+        },
+    },
+}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {list(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def make_model(name='random_forest', **params):
+    """Unfitted estimator of the backend `name`."""
+    return get_backend(name)['make'](**params)
+
+
+def model_steps(name='random_forest', **params):
+    """The scaler and model steps that follow the feature steps of the pipelines."""
+    steps = [
+        ('scaler', StandardScaler()),
+        ('model', make_model(name, **params)),
+    ]
+    if get_backend(name).get('impute'):
+        steps.insert(0, ('imputer', SimpleImputer(strategy='median')))
+    return steps
+
+
+def param_grid(name='random_forest'):
+    return dict(get_backend(name)['param_grid'])
+
+
+def save_model(model, path):
+    logger.info(f"Saving the model to {path}")
+    joblib.dump(model, path)
+
+
+def load_model(path):
+    logger.info(f"Loading the model from {path}")
+    return joblib.load(path)
+
+
+def model_size(model):
+    """Size in bytes of the pickled model."""
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,119 @@
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+import pipeline_withotgrid as p
+from calendar_features import date_ordinals
+
+logger = logging.getLogger(__name__)
+
+
+def rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((np.asarray(y_true, dtype=np.float64) - y_pred) ** 2)))
+
+
+def rmspe(y_true, y_pred):
+    """Root mean squared percentage error over the rows with non-zero sales (the Kaggle metric)."""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    sold = y_true != 0
+    return float(np.sqrt(np.mean(((y_true[sold] - y_pred[sold]) / y_true[sold]) ** 2)))
+
+
+def expanding_window_folds(ordinals, n_folds=3, horizon_days=42):
+    """(train_end, test_end) row positions of date-ordered expanding-window folds.
+
+    `ordinals` must be sorted. Fold k tests on the `horizon_days` days that follow its
+    training window; the last fold ends on the last date of the panel.
+    """
+    last = ordinals[-1] + 1
+    folds = []
+    for k in range(n_folds, 0, -1):
+        test_start = last - k * horizon_days
+        test_end = test_start + horizon_days
+        train_end, test_end = np.searchsorted(ordinals, [test_start, test_end])
+        if train_end == 0:
+            raise ValueError(f"Not enough history for {n_folds} folds of {horizon_days} days")
+        folds.append((int(train_end), int(test_end)))
+    return folds
+
+
+def _run_fold(estimator, matrix_path, target_path, train_end, test_end):
+    # each worker maps the date-ordered panel itself; folds are plain row slices of it
+    X = np.load(matrix_path, mmap_mode='r')
+    y = np.load(target_path, mmap_mode='r')
+    start = time.perf_counter()
+    model = clone(estimator).fit(X[:train_end], y[:train_end])
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = model.predict(X[train_end:test_end])
+    predict_seconds = time.perf_counter() - start
+    y_test = y[train_end:test_end]
+    return {
+        'rmse': rmse(y_test, y_pred),
+        'rmspe': rmspe(y_test, y_pred),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+    }
+
+
+def backtest(path, n_folds=3, horizon_days=42, n_jobs=-1, backend='random_forest'):
+    """Date-ordered expanding-window backtest of the pipeline_withotgrid model (of any backend).
+
+    Features are computed once for the whole store x date panel, the panel is sorted by
+    date once and stored as a memory-mapped matrix, and every fold trains on a prefix and
+    tests on the next `horizon_days` days of it. Folds run in parallel.
+    Returns one row per fold with RMSE, RMSPE and timings.
+    """
+    df = p.load_data(path)
+    X, y = p.prepare_data(df)
+    pipeline = p.build_pipeline(backend)
+    preprocessing = Pipeline(pipeline.steps[:2])
+    estimator = Pipeline(pipeline.steps[2:])
+
+    logger.info("Computing the features of the full panel")
+    start = time.perf_counter()
+    ordinals, _ = date_ordinals(X['Date'])
+    ordinals = pd.Series(ordinals, index=X.index)
+    features = preprocessing.fit_transform(X)
+    # rows dropped by the preprocessing (missing values) are dropped from the target too
+    order = np.argsort(ordinals.loc[features.index].to_numpy(), kind='stable')
+    ordinals = ordinals.loc[features.index].to_numpy()[order]
+    matrix = features.to_numpy(dtype=np.float64)[order]
+    target = y.loc[features.index].to_numpy(dtype=np.float64)[order]
+    logger.info(f"Panel features computed in {time.perf_counter() - start:.1f} seconds")
+
+    folds = expanding_window_folds(ordinals, n_folds, horizon_days)
+    with tempfile.TemporaryDirectory() as directory:
+        matrix_path = os.path.join(directory, 'features.npy')
+        target_path = os.path.join(directory, 'target.npy')
+        np.save(matrix_path, matrix)
+        np.save(target_path, target)
+        del matrix
+
+        logger.info(f"Running {len(folds)} backtest folds")
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_run_fold)(estimator, matrix_path, target_path, train_end, test_end)
+            for train_end, test_end in folds
+        )
+
+    days = ordinals.astype('datetime64[D]')
+    report = pd.DataFrame([
+        {
+            'fold': i,
+            'train_start': days[0],
+            'train_end': days[train_end - 1],
+            'test_start': days[train_end],
+            'test_end': days[test_end - 1],
+            'n_train': train_end,
+            'n_test': test_end - train_end,
+            **result,
+        }
+        for i, ((train_end, test_end), result) in enumerate(zip(folds, results))
+    ])
+    logger.info(f"Backtest results:\n{report}")
+    return report
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from model_artifact import load_model_file
+
+# the shared data loader lives one level up in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_loader import read_rossmann_chunks
+
+logger = logging.getLogger(__name__)
+
+# models already loaded by this process, so every worker loads a model once
+_models = {}
+
+
+def _model(path):
+    if path not in _models:
+        _models[path] = load_model_file(path)
+    return _models[path]
+
+
+def predict_chunk(model_path, chunk, id_column='Id'):
+    """Submission rows of one chunk and the number of rows that went through the model.
+
+    Closed stores sell nothing, so only the open rows are predicted; stores with an
+    unknown Open flag are treated as open.
+    """
+    is_open = chunk['Open'].fillna(1).to_numpy() != 0
+    sales = np.zeros(len(chunk))
+    if is_open.any():
+        X = chunk.loc[is_open].drop(columns=[id_column], errors='ignore')
+        X['Open'] = X['Open'].fillna(1)
+        sales[is_open] = _model(model_path).predict(X)
+    ids = chunk[id_column].to_numpy() if id_column in chunk.columns else chunk.index.to_numpy()
+    return pd.DataFrame({id_column: ids, 'Sales': sales}), int(is_open.sum())
+
+
+def predict_file(model_path, input_path, output_path, chunk_size=100_000, n_jobs=-1, kind='test'):
+    """Score a test.csv shaped file in chunks and write the submission as it goes.
+
+    Chunks are predicted on `n_jobs` worker processes, each loading the model once
+    (artifacts are memory-mapped, so workers share it), and written in input order.
+    """
+    logger.info(f"Scoring {input_path} with {model_path} in chunks of {chunk_size} rows")
+    start = time.perf_counter()
+    rows = predicted = 0
+    chunks = read_rossmann_chunks(input_path, kind, chunksize=chunk_size)
+    results = Parallel(n_jobs=n_jobs, return_as='generator')(
+        delayed(predict_chunk)(model_path, chunk) for chunk in chunks
+    )
+    with open(output_path, 'w', newline='') as f:
+        for i, (submission, n_open) in enumerate(results):
+            submission.to_csv(f, header=i == 0, index=False)
+            rows += len(submission)
+            predicted += n_open
+            logger.info(f"{rows} rows written, {rows / (time.perf_counter() - start):.0f} rows/second")
+
+    seconds = time.perf_counter() - start
+    logger.info(f"Wrote {rows} predictions to {output_path} in {seconds:.1f} seconds "
+                f"({rows / seconds:.0f} rows/second, {rows - predicted} closed rows skipped)")
+    return {'rows': rows, 'predicted_rows': predicted, 'seconds': seconds, 'rows_per_second': rows / seconds}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Write a submission file from a fitted model")
+    parser.add_argument('model_path', help="model artifact or joblib pickle")
+    parser.add_argument('input_path', help="csv with the test.csv columns")
+    parser.add_argument('output_path')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    args = parser.parse_args()
+    predict_file(args.model_path, args.input_path, args.output_path, args.chunk_size, args.n_jobs)
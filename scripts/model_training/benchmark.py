@@ -0,0 +1,211 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import sklearn
+import pipeline as p
+import pipeline_withotgrid as pw
+from model_artifact import load_artifact, save_artifact
+from preprocessing import holiday_dates
+from synthetic_data import SyntheticRossmann
+
+logger = logging.getLogger(__name__)
+
+# Benchmarks of the hot paths at growing row counts. For each benchmark and size we keep
+# the best of `repeat` timed runs (rows per second) and the peak memory allocated by one
+# more run traced with tracemalloc. A saved baseline turns the run into a regression check:
+#   python benchmark.py --sizes 10000 100000 --save-baseline
+#   python benchmark.py --sizes 10000 100000 --threshold 0.2   # exit code 1 on a regression
+BENCHMARK_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# allowed relative drop of the throughput / growth of the peak memory against the baseline
+REGRESSION_THRESHOLD = 0.2
+# rows per request of the serving benchmark, the /predict/batch default limit
+SERVING_BATCH_SIZE = 10_000
+
+
+def make_frame(n_rows, n_stores=1115, seed=0):
+    """Rossmann-shaped training rows (one per store and day) with the dtypes load_rossmann gives."""
+    end = pd.Timestamp('2013-01-01') + pd.Timedelta(days=-(-n_rows // n_stores) - 1)
+    return SyntheticRossmann(n_stores, '2013-01-01', end, test_days=0, seed=seed).train_frame(n_rows)
+
+
+def _features(frame):
+    return frame.drop(columns=['Sales', 'Customers'])
+
+
+def setup_categorical_to_numerical(frame):
+    X = _features(frame)
+    encoder = p.CategoricalToNumerical().fit(X)
+    return X, encoder.transform
+
+
+def setup_feature_extractor(frame):
+    X = p.CategoricalToNumerical().fit_transform(_features(frame))
+    extractor = p.FeatureExtractor().fit(X)
+    return X, extractor.transform
+
+
+def setup_holiday_dates(frame):
+    return frame[['Store', 'Date', 'StateHoliday']], holiday_dates
+
+
+_served_models = {}
+
+
+def _served_model():
+    """A small forest trained once and loaded the way the app serves it (memory-mapped artifact)."""
+    if 'model' not in _served_models:
+        train = make_frame(20_000, seed=1)
+        model = pw.build_pipeline(n_estimators=20, max_depth=12, random_state=0)
+        model.fit(_features(train), train['Sales'])
+        path = os.path.join(tempfile.mkdtemp(prefix='benchmark-'), 'model.artifact')
+        save_artifact(model, path)
+        _served_models['model'] = load_artifact(path)
+    return _served_models['model']
+
+
+def setup_serving(frame):
+    model = _served_model()
+
+    def serve(X):
+        # the rows arrive as /predict/batch requests of SERVING_BATCH_SIZE rows
+        for start in range(0, len(X), SERVING_BATCH_SIZE):
+            model.predict(X.iloc[start:start + SERVING_BATCH_SIZE].copy())
+    return _features(frame), serve
+
+
+# name -> setup(frame) returning the input and the function run on a fresh copy of it
+BENCHMARKS = {
+    'categorical_to_numerical': setup_categorical_to_numerical,
+    'feature_extractor': setup_feature_extractor,
+    'holiday_dates': setup_holiday_dates,
+    'serving': setup_serving,
+}
+
+
+def run_benchmark(name, frame, repeat=3):
+    data, function = BENCHMARKS[name](frame)
+    timings = []
+    for _ in range(repeat):
+        # the functions change their input in place, every run gets its own copy
+        X = data.copy()
+        gc.collect()
+        start = time.perf_counter()
+        function(X)
+        timings.append(time.perf_counter() - start)
+        del X
+
+    X = data.copy()
+    gc.collect()
+    tracemalloc.start()
+    function(X)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        'benchmark': name,
+        'rows': len(frame),
+        'seconds': seconds,
+        'rows_per_second': len(frame) / seconds,
+        'peak_memory_mb': peak / 2**20,
+    }
+
+
+def run_benchmarks(sizes=None, benchmarks=None, repeat=3):
+    results = []
+    for n_rows in sizes or BENCHMARK_SIZES:
+        frame = make_frame(n_rows)
+        for name in benchmarks or list(BENCHMARKS):
+            result = run_benchmark(name, frame, repeat)
+            logger.info(f"{name} on {n_rows} rows: {result['rows_per_second']:,.0f} rows/s, "
+                        f"peak {result['peak_memory_mb']:.1f} MB")
+            results.append(result)
+        del frame
+    return pd.DataFrame(results)
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'machine': machine_info(), 'results': results.to_dict(orient='records')}, f, indent=2)
+    logger.info(f"Benchmark baseline saved to {path}")
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline['machine'] != machine_info():
+        logger.warning(f"The baseline was recorded on another machine or library versions: {baseline['machine']}")
+    return pd.DataFrame(baseline['results'])
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Results joined with the baseline, with a `regression` flag past the threshold."""
+    comparison = results.merge(baseline, on=['benchmark', 'rows'], how='left', suffixes=('', '_baseline'))
+    comparison['throughput_change'] = comparison['rows_per_second'] / comparison['rows_per_second_baseline'] - 1
+    comparison['memory_change'] = comparison['peak_memory_mb'] / comparison['peak_memory_mb_baseline'] - 1
+    # sizes missing from the baseline are reported but can't regress
+    comparison['regression'] = ((comparison['throughput_change'] < -threshold)
+                                | (comparison['memory_change'] > threshold))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the feature extraction, encoding and serving paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES)
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # the transformers log every call; the log I/O isn't what we measure
+    logging.disable(logging.INFO)
+    results = run_benchmarks(args.sizes, args.benchmarks, args.repeat)
+    logging.disable(logging.NOTSET)
+    if args.output:
+        results.to_json(args.output, orient='records', indent=2)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(results.to_string(index=False))
+        return 0
+    if not os.path.exists(args.baseline):
+        print(results.to_string(index=False))
+        logger.warning(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+
+    comparison = compare(results, load_baseline(args.baseline), args.threshold)
+    print(comparison[['benchmark', 'rows', 'rows_per_second', 'throughput_change', 'peak_memory_mb',
+                      'memory_change', 'regression']].to_string(index=False))
+    regressions = comparison[comparison['regression']]
+    if len(regressions):
+        logger.error(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
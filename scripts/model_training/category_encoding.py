@@ -0,0 +1,64 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Date is turned into numeric features by FeatureExtractor, never label encoded
+EXCLUDED_COLUMNS = ['Date']
+# label encoded even when they arrive as numbers (a csv chunk or a request with only 0s)
+CATEGORICAL_COLUMNS = ['StateHoliday']
+
+
+def categorical_columns(X):
+    return [column for column in X.columns
+            if column not in EXCLUDED_COLUMNS
+            and (column in CATEGORICAL_COLUMNS
+                 or isinstance(X[column].dtype, pd.CategoricalDtype)
+                 or pd.api.types.is_object_dtype(X[column])
+                 or pd.api.types.is_string_dtype(X[column]))]
+
+
+def _normalized(X, column):
+    values = X[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if values.dtype == object:
+        if column == 'StateHoliday':
+            # the raw csv mixes the int 0 and the string '0'
+            values = values.replace(0, '0')
+        return values
+    # numbers are looked up by their string, the categories are learned as strings
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        # whole numbers made float by a missing value: 0.0 is still '0'
+        values = values.astype('Int64')
+    return values.astype(object).where(values.notna()).map(str, na_action='ignore')
+
+
+def learn_categories(X):
+    """Sorted categories per categorical column, the same order LabelEncoder uses."""
+    categories = {}
+    for column in categorical_columns(X):
+        values = _normalized(X, column)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # only the categories that actually occur, like LabelEncoder would see them
+            values = values.cat.remove_unused_categories().cat.categories
+        categories[column] = np.sort(pd.unique(np.asarray(values.dropna(), dtype=object)))
+    return categories
+
+
+def encode_categories(X, categories, unknown_value=-1):
+    """Replace every learned categorical column of X by its integer codes in one pass.
+
+    Values missing from the learned categories (or NaN) get `unknown_value`.
+    """
+    for column, known in categories.items():
+        if column not in X.columns:
+            continue
+        codes = pd.Categorical(_normalized(X, column), categories=known).codes.astype(np.int64)
+        unknown = codes < 0
+        if unknown.any():
+            logger.info(f"{unknown.sum()} values of '{column}' were not seen during fit")
+            codes[unknown] = unknown_value
+        X[column] = codes
+    return X
@@ -0,0 +1,130 @@
+import copy
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+# rows predicted together, bounds the (trees x rows) node matrices
+PREDICT_CHUNK_ROWS = 8192
+# the pairs that reached their leaf are dropped once they are this share of the walking ones
+COMPACT_FRACTION = 0.25
+
+
+class FlatForestRegressor(BaseEstimator, RegressorMixin):
+    """A fitted RandomForestRegressor stored as a few flat node arrays.
+
+    All trees are concatenated: node i of tree t lives at roots_[t] + i, its left and
+    right children (global indices, the node itself for a leaf) at children_[2i] and
+    children_[2i + 1]. Plain arrays can be memory-mapped read-only
+    (see model_artifact.py), unlike sklearn's Tree objects which copy their nodes on load.
+    Batches of any size walk the arrays of all trees at once with numpy, so every process
+    predicting with a loaded artifact reads the same shared pages. Predictions are the
+    same as the forest's.
+    """
+
+    @classmethod
+    def from_forest(cls, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        counts = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        # the walk indexes children_ with 2 * node + 1
+        index = np.int32 if 2 * counts.sum() < 2**31 else np.int64
+
+        def children(tree, root):
+            # global indices, and both children of a leaf are the leaf itself, so a pair
+            # that reached its leaf stays on it
+            own = np.arange(tree.node_count)
+            left = np.where(tree.children_left == -1, own, tree.children_left)
+            right = np.where(tree.children_right == -1, own, tree.children_right)
+            return np.stack([left, right], axis=1).ravel() + root
+
+        flat = cls()
+        flat.roots_ = roots.astype(index)
+        flat.children_ = np.concatenate([children(tree, root) for tree, root in zip(trees, roots)]).astype(index)
+        # leaves have the feature -2, like in sklearn's trees
+        flat.feature_ = np.concatenate([tree.feature for tree in trees]).astype(np.int32)
+        flat.threshold_ = np.concatenate([tree.threshold for tree in trees])
+        flat.missing_left_ = np.concatenate([tree.missing_go_to_left for tree in trees]).astype(bool)
+        flat.value_ = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+        flat.n_features_in_ = forest.n_features_in_
+        return flat
+
+    def __setstate__(self, state):
+        # artifacts saved before children_ kept the children in left_ and right_ (-1 for a leaf);
+        # their children_ is built in memory instead of being mapped
+        if 'left_' in state:
+            left, right = state.pop('left_'), state.pop('right_')
+            own = np.arange(len(left), dtype=np.int32 if 2 * len(left) < 2**31 else np.int64)
+            state['children_'] = np.stack([np.where(left == -1, own, left),
+                                           np.where(right == -1, own, right)], axis=1).ravel()
+        super().__setstate__(state)
+
+    def fit(self, X, y=None):
+        # a flat forest has no training algorithm of its own, it is a copy of a fitted forest
+        raise TypeError("FlatForestRegressor cannot be fit, build it from a fitted "
+                        "RandomForestRegressor with FlatForestRegressor.from_forest(forest)")
+
+    def _leaves(self, X):
+        """Leaf reached by every row in every tree, as a (trees, rows) matrix.
+
+        All (tree, row) pairs are walked down together, one level per iteration, so a
+        single row costs a few dozen numpy calls however many trees there are. The pairs
+        of a tree are kept next to each other, which keeps its nodes in the CPU cache.
+        """
+        n_rows, n_features = X.shape
+        has_missing = np.isnan(X).any()
+        X = X.ravel()
+        node = np.repeat(self.roots_, n_rows)
+        # pairs still on an internal node, their node and the offset of their row in X
+        active = np.arange(len(node))
+        current = node
+        offset = np.tile(np.arange(0, n_rows * n_features, n_features), len(self.roots_))
+        while True:
+            feature = self.feature_.take(current)
+            internal = feature >= 0
+            n_internal = np.count_nonzero(internal)
+            if n_internal < len(internal):
+                if not n_internal:
+                    node[active] = current
+                    break
+                # dropping the finished pairs costs a copy of every array, so it waits until
+                # enough of them stay put on their leaf
+                if n_internal <= len(internal) * (1 - COMPACT_FRACTION):
+                    node[active] = current
+                    active, current, offset, feature = (active[internal], current[internal], offset[internal],
+                                                        feature[internal])
+            # a leaf's feature is -2: its pairs read any value of X and stay on it
+            x = X.take(offset + feature)
+            go_left = x <= self.threshold_.take(current)
+            if has_missing:
+                # missing values follow the side learned for them during training, as in sklearn
+                missing = np.isnan(x)
+                go_left[missing] = self.missing_left_.take(current[missing])
+            current = self.children_.take(2 * current + ~go_left)
+        return node.reshape(len(self.roots_), n_rows)
+
+    def predict(self, X):
+        # sklearn's trees compare float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y_pred = np.empty(len(X))
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            values = self.value_[self._leaves(X[start:start + PREDICT_CHUNK_ROWS])]
+            # a running sum in tree order then divided, like the forest, so the floats match it exactly
+            y_pred[start:start + PREDICT_CHUNK_ROWS] = np.cumsum(values, axis=0)[-1] / len(self.roots_)
+        return y_pred
+
+
+def compile_forests(model):
+    """Copy of a fitted model with every RandomForestRegressor replaced by a FlatForestRegressor.
+
+    Walks Pipelines and the shard models of a ShardedRegressor; anything else is kept as is.
+    """
+    if isinstance(model, RandomForestRegressor) and hasattr(model, 'estimators_') and model.n_outputs_ == 1:
+        return FlatForestRegressor.from_forest(model)
+    if isinstance(model, Pipeline):
+        return Pipeline([(name, compile_forests(step)) for name, step in model.steps])
+    if hasattr(model, 'models_'):
+        compiled = copy.copy(model)
+        compiled.models_ = {key: compile_forests(shard) for key, shard in model.models_.items()}
+        return compiled
+    return model
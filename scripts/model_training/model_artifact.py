@@ -0,0 +1,197 @@
+import argparse
+import datetime
+import hashlib
+import io
+import json
+import logging
+import pickle
+import struct
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from flat_forest import FlatForestRegressor
+
+logger = logging.getLogger(__name__)
+
+# File layout:
+#   MAGIC | uint64 header length | json header | padding | data
+# The data holds every large numpy array of the model, uncompressed and aligned so it can be
+# memory-mapped in place, followed by the pickled rest of the model (the "skeleton") which
+# refers to the arrays by index. Offsets in the header are relative to the start of the data.
+MAGIC = b'RSMODEL\x00'
+FORMAT_VERSION = 1
+PAGE_SIZE = 4096
+# arrays smaller than this stay inside the pickle
+MIN_MAPPED_BYTES = 1024
+ARTIFACT_SUFFIX = '.artifact'
+
+
+def _align(offset, alignment):
+    return -(-offset // alignment) * alignment
+
+
+class _ArtifactPickler(pickle.Pickler):
+    def __init__(self, file, flatten_forests=True):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.flatten_forests = flatten_forests
+        self.arrays = []
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray and not obj.dtype.hasobject and obj.nbytes >= MIN_MAPPED_BYTES:
+            self.arrays.append(np.ascontiguousarray(obj))
+            return ('array', len(self.arrays) - 1)
+        return None
+
+    def reducer_override(self, obj):
+        # sklearn trees copy their nodes when unpickled, so forests are stored as flat arrays
+        if (self.flatten_forests and isinstance(obj, RandomForestRegressor)
+                and hasattr(obj, 'estimators_') and obj.n_outputs_ == 1):
+            return FlatForestRegressor, (), FlatForestRegressor.from_forest(obj).__getstate__()
+        return NotImplemented
+
+
+class _ArtifactUnpickler(pickle.Unpickler):
+    def __init__(self, file, arrays):
+        super().__init__(file)
+        self.arrays = arrays
+
+    def persistent_load(self, pid):
+        kind, index = pid
+        if kind != 'array':
+            raise pickle.UnpicklingError(f"Unknown reference {pid} in the model artifact")
+        return self.arrays[index]
+
+
+def save_artifact(model, path, metadata=None, flatten_forests=True):
+    """Write a fitted model (usually the whole pipeline) as a memory-mappable artifact.
+
+    `metadata` is any json-serializable dict kept in the header (model version, metrics...).
+    Returns the header.
+    """
+    skeleton = io.BytesIO()
+    pickler = _ArtifactPickler(skeleton, flatten_forests)
+    pickler.dump(model)
+    skeleton = skeleton.getvalue()
+
+    entries = []
+    offset = 0
+    for array in pickler.arrays:
+        # large arrays start on a page, small ones on a cache line
+        offset = _align(offset, PAGE_SIZE if array.nbytes >= PAGE_SIZE else 64)
+        entries.append({'dtype': np.lib.format.dtype_to_descr(array.dtype), 'shape': list(array.shape),
+                        'offset': offset, 'nbytes': array.nbytes})
+        offset += array.nbytes
+    skeleton_offset = _align(offset, 64)
+
+    checksum = hashlib.sha256()
+    for array, entry in zip(pickler.arrays, entries):
+        checksum.update(struct.pack('<Q', entry['offset']))
+        checksum.update(memoryview(array).cast('B'))
+    checksum.update(skeleton)
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'numpy_version': np.__version__,
+        'metadata': metadata or {},
+        'arrays': entries,
+        'skeleton': {'offset': skeleton_offset, 'nbytes': len(skeleton)},
+        'sha256': checksum.hexdigest(),
+    }
+    encoded = json.dumps(header).encode()
+    data_start = _align(len(MAGIC) + 8 + len(encoded), PAGE_SIZE)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(encoded)))
+        f.write(encoded)
+        for array, entry in zip(pickler.arrays, entries):
+            f.seek(data_start + entry['offset'])
+            f.write(memoryview(array).cast('B'))
+        f.seek(data_start + skeleton_offset)
+        f.write(skeleton)
+    logger.info(f"Model artifact written to {path}: {len(entries)} mapped arrays, "
+                f"{(data_start + skeleton_offset + len(skeleton)) / 2**20:.1f} MB")
+    return header
+
+
+def read_header(path):
+    """Header of an artifact and the file offset of its data."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size))
+    if header['format_version'] > FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {header['format_version']}, "
+                         f"this code reads up to version {FORMAT_VERSION}")
+    return header, _align(len(MAGIC) + 8 + size, PAGE_SIZE)
+
+
+def _checksum(header, data):
+    checksum = hashlib.sha256()
+    for entry in header['arrays']:
+        checksum.update(struct.pack('<Q', entry['offset']))
+        checksum.update(data[entry['offset']:entry['offset'] + entry['nbytes']])
+    skeleton = header['skeleton']
+    checksum.update(data[skeleton['offset']:skeleton['offset'] + skeleton['nbytes']])
+    return checksum.hexdigest()
+
+
+def load_artifact(path, verify=False):
+    """Load a model artifact with its arrays memory-mapped read-only.
+
+    Only the small skeleton is unpickled, so loading is near instant and processes loading
+    the same file share its pages. `verify=True` checks the checksum first, which reads
+    the whole file.
+    """
+    header, data_start = read_header(path)
+    if header['sklearn_version'] != sklearn.__version__:
+        logger.warning(f"{path} was written with scikit-learn {header['sklearn_version']}, "
+                       f"running {sklearn.__version__}")
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)
+    if verify and _checksum(header, data) != header['sha256']:
+        raise ValueError(f"Checksum mismatch, {path} is corrupted")
+
+    arrays = [
+        np.ndarray(entry['shape'], dtype=np.lib.format.descr_to_dtype(entry['dtype']),
+                   buffer=data, offset=entry['offset'])
+        for entry in header['arrays']
+    ]
+    skeleton = header['skeleton']
+    model = _ArtifactUnpickler(io.BytesIO(data[skeleton['offset']:skeleton['offset'] + skeleton['nbytes']]),
+                               arrays).load()
+    logger.info(f"Model artifact loaded from {path} (created {header['created']})")
+    return model
+
+
+def verify_artifact(path):
+    header, data_start = read_header(path)
+    return _checksum(header, np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)) == header['sha256']
+
+
+def load_model_file(path):
+    """Load a model from an artifact, or from a joblib pickle for any other file."""
+    if path.endswith(ARTIFACT_SUFFIX):
+        return load_artifact(path)
+    logger.info(f"Loading the pickled model from {path}")
+    return joblib.load(path)
+
+
+def convert_pickle(pickle_path, artifact_path=None, metadata=None):
+    """Convert a joblib pickle such as final_model.pkl to an artifact next to it."""
+    if artifact_path is None:
+        artifact_path = pickle_path.rsplit('.', 1)[0] + ARTIFACT_SUFFIX
+    save_artifact(joblib.load(pickle_path), artifact_path, metadata)
+    return artifact_path
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert a pickled model to a memory-mappable artifact")
+    parser.add_argument('pickle_path')
+    parser.add_argument('artifact_path', nargs='?')
+    args = parser.parse_args()
+    print(convert_pickle(args.pickle_path, args.artifact_path))
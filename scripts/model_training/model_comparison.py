@@ -0,0 +1,73 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+import pipeline_withotgrid as p
+from backends import BACKENDS, model_size, model_steps
+from backtest import rmse, rmspe
+
+logger = logging.getLogger(__name__)
+
+
+def single_row_latency(model, X, n_rows=50):
+    """Median seconds of a one-row predict, the way the dashboard calls the model."""
+    timings = []
+    for i in range(min(n_rows, len(X))):
+        row = X[i:i + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def compare_backends(path, backends=None, test_size=0.2, latency_rows=50):
+    """Train every backend on the same features and report its cost and error.
+
+    The encoders and calendar features are fitted once on the training split; each backend
+    then fits its scaler and model on that matrix. One row per backend with training time,
+    batch and single-row prediction time, pickled model size and test error.
+    """
+    df = p.load_data(path)
+    X, y = p.prepare_data(df)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+
+    logger.info("Computing the features once for all backends")
+    preprocessing = Pipeline(p.build_pipeline().steps[:2])
+    train = preprocessing.fit_transform(X_train)
+    test = preprocessing.transform(X_test)
+    # rows dropped by the preprocessing (missing values) are dropped from the target too
+    y_train = y_train.loc[train.index].to_numpy(dtype=np.float64)
+    y_test = y_test.loc[test.index].to_numpy(dtype=np.float64)
+    train = train.to_numpy(dtype=np.float64)
+    test = test.to_numpy(dtype=np.float64)
+
+    rows = []
+    for name in backends or BACKENDS:
+        logger.info(f"Training the {name} backend")
+        model = Pipeline(model_steps(name))
+        start = time.perf_counter()
+        model.fit(train, y_train)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = model.predict(test)
+        predict_seconds = time.perf_counter() - start
+
+        rows.append({
+            'backend': name,
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds,
+            'row_latency_ms': single_row_latency(model, test, latency_rows) * 1000,
+            'model_mb': model_size(model) / 2**20,
+            'rmse': rmse(y_test, y_pred),
+            'rmspe': rmspe(y_test, y_pred),
+            'mae': mean_absolute_error(y_test, y_pred),
+            'r2': r2_score(y_test, y_pred),
+        })
+
+    report = pd.DataFrame(rows).set_index('backend')
+    logger.info(f"Backend comparison:\n{report}")
+    return report
@@ -0,0 +1,238 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+from model_artifact import ARTIFACT_SUFFIX, load_artifact, load_model_file, read_header, save_artifact
+
+logger = logging.getLogger(__name__)
+
+# Registry layout: one immutable artifact per version, named by its training timestamp,
+# and a CURRENT file holding the active version
+#   models/20241001-120000.artifact
+#   models/20241008-093000.artifact
+#   models/CURRENT
+CURRENT_FILE = 'CURRENT'
+# held by the process publishing the seed model of an empty registry, holds its pid, host and start time
+SEED_LOCK_FILE = 'SEEDING'
+# seconds after which a seeding lock is taken over even if its owner looks alive
+SEED_LOCK_TIMEOUT = 600.0
+VERSION_FORMAT = '%Y%m%d-%H%M%S'
+
+
+def version_path(registry_dir, version):
+    return os.path.join(registry_dir, f"{version}{ARTIFACT_SUFFIX}")
+
+
+def list_versions(registry_dir):
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name[:-len(ARTIFACT_SUFFIX)] for name in os.listdir(registry_dir) if name.endswith(ARTIFACT_SUFFIX))
+
+
+def _write_atomically(path, text):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def activate_version(registry_dir, version):
+    """Make `version` the served one (also how to roll back)."""
+    if not os.path.exists(version_path(registry_dir, version)):
+        raise ValueError(f"No model version {version} in {registry_dir}")
+    _write_atomically(os.path.join(registry_dir, CURRENT_FILE), version)
+    logger.info(f"Model version {version} activated")
+
+
+def current_version(registry_dir):
+    """Active version, the latest one when none was activated, None for an empty registry."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        versions = list_versions(registry_dir)
+        return versions[-1] if versions else None
+
+
+def publish_model(model, registry_dir, metadata=None, activate=True):
+    """Store a fitted model as a new timestamped version and return the version."""
+    os.makedirs(registry_dir, exist_ok=True)
+    now = datetime.datetime.now()
+    version = now.strftime(VERSION_FORMAT)
+    while os.path.exists(version_path(registry_dir, version)):
+        now += datetime.timedelta(seconds=1)
+        version = now.strftime(VERSION_FORMAT)
+
+    # written under a temporary name so a watching server never maps a partial file
+    path = version_path(registry_dir, version)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    save_artifact(model, tmp, {'version': version, **(metadata or {})})
+    os.replace(tmp, path)
+    logger.info(f"Model version {version} published to {registry_dir}")
+    if activate:
+        activate_version(registry_dir, version)
+    return version
+
+
+def publish_file(path, registry_dir, metadata=None, activate=True):
+    """Publish a model saved elsewhere (artifact or joblib pickle), e.g. final_model.pkl."""
+    return publish_model(load_model_file(path), registry_dir, {'source': os.path.basename(path), **(metadata or {})},
+                         activate)
+
+
+def _process_alive(pid):
+    if os.name != 'posix':
+        # os.kill(pid, 0) sends a CTRL_C_EVENT on Windows, only the timeout applies there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def lock_is_stale(lock, timeout=SEED_LOCK_TIMEOUT):
+    """True when the owner of a seeding lock died (same host) or it is older than `timeout` seconds."""
+    try:
+        with open(lock) as f:
+            owner = f.read().split()
+        age = time.time() - os.path.getmtime(lock)
+    except FileNotFoundError:
+        return False
+    try:
+        pid, host, created = int(owner[0]), owner[1], float(owner[2])
+    except (IndexError, ValueError):
+        # the owner was interrupted before writing itself, or is still writing
+        return age > timeout
+    if time.time() - created > timeout:
+        return True
+    return host == socket.gethostname() and not _process_alive(pid)
+
+
+class ModelNotReady(RuntimeError):
+    """No model version could be loaded yet."""
+
+
+class ModelHolder:
+    """The model served from a registry, loaded lazily and hot-swapped on activation.
+
+    `get()` returns a (model, version) pair; a request keeps using the pair it got even if
+    a new version is swapped in meanwhile, so nothing in flight is dropped. A new version is
+    only swapped in after `warmup(model)` succeeded on it. An empty registry is first seeded
+    with the first existing file of `seed_paths`, in the background like the loading.
+    """
+    def __init__(self, registry_dir, warmup=None, poll_interval=5.0, seed_paths=None,
+                 seed_lock_timeout=SEED_LOCK_TIMEOUT):
+        self.registry_dir = registry_dir
+        self.warmup = warmup
+        self.poll_interval = poll_interval
+        self.seed_paths = list(seed_paths or [])
+        self.seed_lock_timeout = seed_lock_timeout
+        self.error = None
+        self._current = None
+        # a version that failed to load is not retried until another one is activated
+        self._failed = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._current is not None
+
+    @property
+    def version(self):
+        return self._current[1] if self._current is not None else None
+
+    def get(self):
+        if self._current is None:
+            self.refresh()
+            if self._current is None:
+                raise ModelNotReady(f"No model available in {self.registry_dir}: {self.error}")
+        return self._current
+
+    def refresh(self):
+        """Load the active version if it is not the one being served; True when it swapped."""
+        with self._lock:
+            version = current_version(self.registry_dir)
+            if version is None:
+                self.error = "no model version has been published"
+                return False
+            if version == self.version or version == self._failed:
+                return False
+            try:
+                path = version_path(self.registry_dir, version)
+                model = load_artifact(path)
+                if self.warmup is not None:
+                    self.warmup(model)
+            except Exception as e:
+                # keep serving the previous version
+                self.error = f"Loading model version {version} failed: {e}"
+                self._failed = version
+                logger.error(self.error)
+                return False
+            previous = self.version
+            self._current = (model, version)
+            self.error = None
+            logger.info(f"Serving model version {version} (created {read_header(path)[0]['created']}), "
+                        f"replacing {previous}")
+            return True
+
+    def seed(self):
+        """Publish the first existing seed file to an empty registry; the version or None."""
+        if list_versions(self.registry_dir):
+            return None
+        paths = [path for path in self.seed_paths if os.path.exists(path)]
+        if not paths:
+            return None
+        os.makedirs(self.registry_dir, exist_ok=True)
+        lock = os.path.join(self.registry_dir, SEED_LOCK_FILE)
+        if not self._acquire_seed_lock(lock):
+            # another worker is publishing it, a later poll picks it up
+            return None
+        try:
+            if list_versions(self.registry_dir):
+                return None
+            logger.info(f"Seeding the empty registry {self.registry_dir} with {paths[0]}")
+            return publish_file(paths[0], self.registry_dir)
+        finally:
+            os.remove(lock)
+
+    def _acquire_seed_lock(self, lock):
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not lock_is_stale(lock, self.seed_lock_timeout):
+                    return False
+                # left by a worker that died while seeding
+                logger.warning(f"Taking over the stale seeding lock {lock}")
+                try:
+                    os.remove(lock)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(f"{os.getpid()} {socket.gethostname()} {time.time()}")
+            return True
+        return False
+
+    def _watch(self):
+        while True:
+            if self._current is None:
+                # retried on every poll until a model is served, in case the seeding worker died
+                try:
+                    self.seed()
+                except Exception as e:
+                    self.error = f"Seeding the registry failed: {e}"
+                    logger.error(self.error)
+            self.refresh()
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        """Load in the background and keep polling the registry for a new active version."""
+        thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        thread.start()
+        return thread
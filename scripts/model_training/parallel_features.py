@@ -0,0 +1,92 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# below this many rows the pool costs more than it saves
+PARALLEL_MIN_ROWS = 100_000
+
+# (compute, frame, columns, partitions, outputs) of the running call, set by the parent
+# just before the pool forks so the workers inherit it instead of receiving a pickled copy
+_task = None
+
+
+def fork_available():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def effective_n_jobs(n_jobs):
+    # joblib's convention: -1 is every core, -2 all but one, ...
+    cpus = os.cpu_count() or 1
+    if n_jobs is None:
+        return 1
+    return max(1, n_jobs if n_jobs > 0 else cpus + 1 + n_jobs)
+
+
+def store_partitions(stores, n_partitions):
+    """Row positions of `n_partitions` groups of whole stores, balanced by row count."""
+    codes, uniques = pd.factorize(stores)
+    counts = np.bincount(codes, minlength=len(uniques))
+    partition_of_store = np.empty(len(uniques), dtype=np.int64)
+    loads = np.zeros(n_partitions, dtype=np.int64)
+    # largest stores first, each to the lightest partition so far
+    for store in np.argsort(-counts, kind='stable'):
+        partition = loads.argmin()
+        partition_of_store[store] = partition
+        loads[partition] += counts[store]
+    partition_of_row = partition_of_store[codes]
+    # positions grouped by partition, in their original order within a partition
+    order = np.argsort(partition_of_row, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(partition_of_row, minlength=n_partitions))])
+    return [order[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _shared_array(length, dtype):
+    # anonymous shared mapping: what a forked worker writes is visible to the parent
+    dtype = np.dtype(dtype)
+    if dtype.hasobject:
+        raise ValueError("Partitioned computations must return numeric columns")
+    return np.frombuffer(mmap.mmap(-1, max(length * dtype.itemsize, 1)), dtype=dtype, count=length)
+
+
+def _run_partition(index):
+    compute, frame, columns, partitions, outputs = _task
+    rows = partitions[index]
+    # only this partition's rows of the needed columns are copied
+    part = pd.DataFrame({column: frame[column].iloc[rows] for column in columns})
+    for name, values in compute(part).items():
+        outputs[name][rows] = values
+    return len(rows)
+
+
+def partitioned_columns(frame, compute, columns, partition_column='Store', n_jobs=-1):
+    """New columns of `frame` computed per group of stores in a process pool.
+
+    `compute(rows)` gets a DataFrame of some stores' rows (the `columns` of `frame`) and
+    returns {name: numeric values} for those rows. Workers are forked, so they read
+    `frame` from the parent's memory, and write their results straight into shared
+    arrays at the rows' original positions: the returned {name: array} is in the
+    order of `frame` with no reassembly. Falls back to one call on the whole frame for
+    small frames, n_jobs=1 or platforms without fork.
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs == 1 or len(frame) < PARALLEL_MIN_ROWS or not fork_available():
+        return compute(frame[columns].copy())
+
+    global _task
+    partitions = store_partitions(frame[partition_column].to_numpy(), n_jobs)
+    # the output columns and their types, from a single row
+    sample = compute(frame[columns].iloc[:1].copy())
+    outputs = {name: _shared_array(len(frame), np.asarray(values).dtype) for name, values in sample.items()}
+    logger.info(f"Computing {list(outputs)} for {len(frame)} rows in {len(partitions)} store partitions")
+    _task = (compute, frame, columns, partitions, outputs)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(n_jobs, len(partitions))) as pool:
+            pool.map(_run_partition, range(len(partitions)))
+    finally:
+        _task = None
+    return outputs
@@ -1,158 +1,166 @@
 from sklearn.model_selection import GridSearchCV
 import pandas as pd
+import gc
 import logging 
 import os
-from sklearn.base import BaseEstimator, TransformerMixin
+import sys
+import tempfile
 from sklearn.pipeline import Pipeline
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 import numpy as np
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from pipeline_steps import CategoricalToNumerical, FeatureExtractor
+
+# the shared data loader lives one level up in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_loader import load_rossmann
+from search import cost_report, halving_search, record_search, warm_start_search
+from profiling import profile_run, span, timed
+from backends import model_steps as backend_steps, param_grid as backend_param_grid
 
 # configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Custom transformer for categorical to numerical conversion
-class CategoricalToNumerical(BaseEstimator, TransformerMixin):
-    def fit(self, X, y=None):
-        return self
-
-    def transform(self, X):
-        logger.info("Converting categorical columns to numerical columns")
-        for column in X.select_dtypes(include=[object]).columns:
-            if column == 'StateHoliday':
-                X[column] = X[column].replace(0, '0')
-            X[column] = LabelEncoder().fit_transform(X[column])
-        return X
-
-# Custom transformer for feature extraction
-class FeatureExtractor(BaseEstimator, TransformerMixin):
-    def fit(self, X, y=None):
-        return self
-
-    def transform(self, X):
-        logger.info("Extracting new features")
-
-        # Ensure the 'Date' column is properly converted to datetime before transformations
-        if 'Date' in X.columns:
-            X['Date'] = pd.to_datetime(X['Date'], errors='coerce')  # Handle invalid dates
-
-            # Calculate whether it's the weekend
-            X['Weekend'] = X['DayOfWeek'].apply(lambda x: 1 if x >= 6 else 0)
-
-            # Create a new feature 'MonthPosition'
-            X['MonthPosition'] = X['Date'].dt.day.apply(lambda x: 'Start' if x <= 10 else ('Mid' if x <= 20 else 'End'))
-
-            # Convert 'MonthPosition' into numerical values (label encoding)
-            X['MonthPosition'] = LabelEncoder().fit_transform(X['MonthPosition'])
-
-            # Convert 'Date' to the number of days since the start of the year for numerical purposes
-            X['DaysSinceStartOfYear'] = X['Date'].apply(lambda x: (x - pd.Timestamp(f'{x.year}-01-01')).days if pd.notnull(x) else np.nan)
-
-            # Extract all holiday dates
-            all_holiday_dates = X[(X['StateHoliday'] != '0') & (X['StateHoliday'].notnull())]['Date'].unique()
-            holidays = pd.to_datetime(all_holiday_dates)
-
-            # Calculate days to the next holiday
-            X['DaysToNextHoliday'] = X['Date'].apply(lambda x: self.days_to_next_holiday(x, holidays))
-
-            # Calculate days after the most recent holiday
-            X['DaysAfterHoliday'] = X['Date'].apply(
-                lambda x: (x - holidays[holidays <= x].max()).days if len(holidays[holidays <= x]) > 0 else np.nan
-            )
-
-            # Drop the 'Date' column after extraction if it's not needed anymore
-            X = X.drop(columns=['Date'])
-
-        return X
-
-    def days_to_next_holiday(self, date, holidays):
-        holidays = pd.Series(holidays)
-        future_holidays = holidays[holidays >= date]
-        if len(future_holidays) > 0:
-            return (future_holidays.min() - date).days
-        next_year = date.year + 1
-        next_year_holidays = holidays[holidays.dt.year == next_year]
-        if len(next_year_holidays) > 0:
-            return (next_year_holidays.min() - date).days
-        return -1
-
 # Load data function
-def load_data(path):
+def load_data(path, columns=None, cache=True):
     logger.info("Loading the dataset")
     try:
-        return pd.read_csv(path)
+        return load_rossmann(path, columns=columns, cache=cache)
     except Exception as e:
         logger.error(f"Error occurred: {e}")
         return None
 
-def main(path):
+@timed()
+def precompute_features(preprocessing, X, directory):
+    """Fit the preprocessing steps once and keep their output as a read-only memory-mapped frame.
+
+    GridSearchCV workers receive the memory map instead of a pickled copy.
+    """
+    logger.info("Materializing the feature matrix")
+    features = preprocessing.fit_transform(X.copy())
+    path = os.path.join(directory, 'features.npy')
+    # stored column-major, the layout pandas keeps internally: the frame then wraps the
+    # memory map itself rather than a strided view of it, which joblib can't hand to workers
+    np.save(path, np.ascontiguousarray(features.to_numpy(dtype=np.float64).T))
+    matrix = np.load(path, mmap_mode='r')
+    logger.info(f"Feature matrix of shape {matrix.T.shape} stored in {path}")
+    return pd.DataFrame(matrix.T, columns=features.columns, index=features.index, copy=False)
+
+def main(path, precompute=True, n_jobs=None, search='grid', search_options=None, backend='random_forest',
+         profile_path=None):
     try:
-        # Load dataset
+        # wall / CPU time and rows of every stage, written as JSON and summarized at the end of the run
+        with profile_run('pipeline.main', profile_path, backend=backend, search=search, precompute=precompute):
+            return _train(path, precompute, n_jobs, search, search_options, backend)
+    except Exception as e:
+        logger.error(f"Error: {e}")
+
+def _train(path, precompute, n_jobs, search, search_options, backend):
+    # Load dataset
+    with span('load_data') as stage:
         df = load_data(path)
-        logger.info("Separating the target variable")
-        
-        # Train-test split
-        X = df.drop('Sales', axis=1)
-        y = df['Sales']
-        logger.info("Target variable split complete")
-
-        logger.info("Splitting the data into train and test sets")
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        logger.info("Data split complete")
-
-        logger.info("Creating the sklearn pipeline")
-        # Create the pipeline
-        pipeline = Pipeline([
-            ('categorical_to_numerical', CategoricalToNumerical()),
-            ('feature_extractor', FeatureExtractor()),
-            ('scaler', StandardScaler()),
-            ('model', RandomForestRegressor(random_state=42))
-        ])
-        logger.info("Sklearn pipeline created")
-
-        logger.info("Defining parameter grid")
-        param_grid = {
-            'model__n_estimators': [100, 200],
-            'model__max_depth': [None, 10, 20],
-            'model__min_samples_split': [2, 5, 10]
-        }
-        logger.info("Parameter grid defined")
-
-        # Setup GridSearchCV
-        logger.info("Setting up GridSearchCV")
-        grid_search = GridSearchCV(pipeline, param_grid, cv=5, scoring='neg_mean_squared_error')
-        logger.info("GridSearchCV setup complete")
-
-        logger.info("Fitting the GridSearchCV")
-        grid_search.fit(X_train, y_train)  # Fit the grid search on the training data
-        logger.info("GridSearchCV fitting completed")
+        stage.rows = len(df)
+    logger.info("Separating the target variable")
+    
+    # Train-test split
+    X = df.drop('Sales', axis=1)
+    y = df['Sales']
+    logger.info("Target variable split complete")
+
+    logger.info("Splitting the data into train and test sets")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    logger.info("Data split complete")
+
+    logger.info("Creating the sklearn pipeline")
+    # Create the pipeline
+    preprocessing = Pipeline([
+        ('categorical_to_numerical', CategoricalToNumerical()),
+        ('feature_extractor', FeatureExtractor())
+    ])
+    # scaler + the model of the chosen backend (random_forest, hist_gradient_boosting or linear)
+    model_steps = backend_steps(backend)
+    pipeline = Pipeline(preprocessing.steps + model_steps)
+    logger.info("Sklearn pipeline created")
+
+    logger.info("Defining parameter grid")
+    param_grid = backend_param_grid(backend)
+    logger.info("Parameter grid defined")
+
+    # the directory can only be removed once nothing maps its features (Windows refuses to
+    # delete a mapped file); a leftover one must not fail the run
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as feature_dir:
+        if precompute:
+            # the encoders and calendar features don't depend on the model parameters, so they
+            # are computed once and only the scaler and the model run per fold and candidate
+            search_X = precompute_features(preprocessing, X_train, feature_dir)
+            search_pipeline = Pipeline(model_steps)
+        else:
+            search_X = X_train
+            search_pipeline = pipeline
+
+        if search == 'warm_start':
+            if backend != 'random_forest':
+                raise ValueError("The warm start search grows random forests only")
+            # one forest per depth/split candidate grown through the n_estimators checkpoints
+            with span('warm_start_search', rows=len(search_X)):
+                best_model, best_params, curves = warm_start_search(
+                    search_pipeline, search_X, y_train, param_grid, **(search_options or {}))
+            print(curves)
+        elif search == 'halving':
+            # successive halving over a wider space, candidates evaluated in parallel on all cores
+            options = dict(search_options or {})
+            if backend != 'random_forest':
+                # the wider default space is a forest grid
+                options.setdefault('param_grid', param_grid)
+            grid_search = halving_search(search_pipeline, search_X, y_train,
+                                         n_jobs=-1 if n_jobs is None else n_jobs, **options)
+            print(cost_report(grid_search))
+        else:
+            # Setup GridSearchCV
+            logger.info("Setting up GridSearchCV")
+            grid_search = GridSearchCV(search_pipeline, param_grid, cv=5, scoring='neg_mean_squared_error', n_jobs=n_jobs)
+            logger.info("GridSearchCV setup complete")
+
+            logger.info("Fitting the GridSearchCV")
+            with span('grid_search', rows=len(search_X)):
+                grid_search.fit(search_X, y_train)  # Fit the grid search on the training data
+                # one span per candidate and CV fold
+                record_search(grid_search)
+            logger.info("GridSearchCV fitting completed")
 
         logger.info("Selecting the best model and parameters")
         # Best model and parameters
-        best_model = grid_search.best_estimator_  # Access best estimator from the fitted GridSearchCV
-        print("Best parameters:", grid_search.best_params_)
-        logger.info(f"Best parameters: {grid_search.best_params_}")
-
-        # Predict on test data
+        if search != 'warm_start':
+            best_model = grid_search.best_estimator_  # Access best estimator from the fitted GridSearchCV
+            best_params = grid_search.best_params_
+            del grid_search
+        # release the memory map of the precomputed features before the directory goes
+        del search_X
+        gc.collect()
+
+    if precompute:
+        # put the fitted preprocessing steps back in front of the best scaler and model
+        best_model = Pipeline(preprocessing.steps + best_model.steps)
+    print("Best parameters:", best_params)
+    logger.info(f"Best parameters: {best_params}")
+
+    # Predict on test data
+    with span('predict_test', rows=len(X_test)):
         y_pred = best_model.predict(X_test)
 
-        # Calculate evaluation metrics
-        mse = mean_squared_error(y_test, y_pred)
-        mae = mean_absolute_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
+    # Calculate evaluation metrics
+    mse = mean_squared_error(y_test, y_pred)
+    mae = mean_absolute_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
 
-        # Log and print metrics
-        logger.info(f"Mean Squared Error (MSE): {mse}")
-        logger.info(f"Mean Absolute Error (MAE): {mae}")
-        logger.info(f"R-squared (R²): {r2}")
+    # Log and print metrics
+    logger.info(f"Mean Squared Error (MSE): {mse}")
+    logger.info(f"Mean Absolute Error (MAE): {mae}")
+    logger.info(f"R-squared (R²): {r2}")
 
-        print(f"Mean Squared Error (MSE): {mse}")
-        print(f"Mean Absolute Error (MAE): {mae}")
-        print(f"R-squared (R²): {r2}")
+    print(f"Mean Squared Error (MSE): {mse}")
+    print(f"Mean Absolute Error (MAE): {mae}")
+    print(f"R-squared (R²): {r2}")
 
-        return best_model
-    except Exception as e:
-        logger.error(f"Error: {e}")
+    return best_model
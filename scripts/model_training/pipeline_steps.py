@@ -0,0 +1,143 @@
+import logging
+import os
+import sys
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from category_encoding import encode_categories, learn_categories
+from calendar_features import CalendarTable, DateDictionary, add_date_features, date_ordinals
+from parallel_features import partitioned_columns
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from profiling import timed
+
+logger = logging.getLogger(__name__)
+
+# The preprocessing steps shared by pipeline.py, pipeline_withotgrid.py and streaming.py
+
+
+# Custom transformer for categorical to numerical conversion
+class CategoricalToNumerical(BaseEstimator, TransformerMixin):
+    # for models pickled before these parameters existed, all trained with pipeline_withotgrid
+    unknown_value = -1
+    drop_missing = True
+
+    def __init__(self, unknown_value=-1, drop_missing=False):
+        # code given to categories that were not seen during fit
+        self.unknown_value = unknown_value
+        # drop the Id column and the rows with missing values before encoding
+        self.drop_missing = drop_missing
+
+    @timed()
+    def fit(self, X, y=None):
+        logger.info("Learning the category codes")
+        self.categories_ = learn_categories(X)
+        return self
+
+    def partial_fit(self, X, y=None):
+        # for data read in chunks: the categories seen so far merged with this chunk's
+        categories = learn_categories(X)
+        for column, known in getattr(self, 'categories_', {}).items():
+            categories[column] = np.union1d(known, categories[column]) if column in categories else known
+        self.categories_ = categories
+        return self
+
+    @timed()
+    def transform(self, X):
+        if self.drop_missing:
+            if 'Id' in X.columns:
+                X.drop(columns=['Id'], inplace=True)
+            X.dropna(inplace=True)
+        logger.info("Converting categorical columns to numerical columns")
+        # not fitted: learn the codes from this batch like before
+        categories = self.categories_ if hasattr(self, 'categories_') else learn_categories(X)
+        return encode_categories(X, categories, self.unknown_value)
+
+# Custom transformer for feature extraction
+class FeatureExtractor(BaseEstimator, TransformerMixin):
+    # for models pickled before n_jobs existed
+    n_jobs = None
+
+    def __init__(self, holiday_group=None, horizon_days=365, holidays=None, n_jobs=None):
+        # optional column (e.g. 'Store' or 'State') to keep one holiday calendar per value
+        self.holiday_group = holiday_group
+        # days past the last training date covered by the fitted calendar table
+        self.horizon_days = horizon_days
+        # extra known holiday dates (e.g. upcoming public holidays in the forecast horizon)
+        self.holidays = holidays
+        # processes transforming large frames, one group of stores each (None: in this process)
+        self.n_jobs = n_jobs
+
+    @timed()
+    def fit(self, X, y=None):
+        logger.info("Building the calendar lookup table")
+        if 'Date' in X.columns:
+            dates = DateDictionary(X['Date'])
+            groups = X[self.holiday_group].to_numpy() if self.holiday_group is not None else None
+            calendar = dates.holiday_calendar(X['StateHoliday'], groups)
+            known = dates.ordinals[dates.valid]
+            self._fit_calendar(calendar, known.min(), known.max())
+        return self
+
+    def partial_fit(self, X, y=None):
+        # for data read in chunks: the holidays and date range seen so far grow with every chunk
+        if 'Date' in X.columns:
+            dates = DateDictionary(X['Date'])
+            groups = X[self.holiday_group].to_numpy() if self.holiday_group is not None else None
+            calendar = dates.holiday_calendar(X['StateHoliday'], groups)
+            known = dates.ordinals[dates.valid]
+            if not len(known):
+                return self
+            first, last = known.min(), known.max()
+            if hasattr(self, 'observed_holidays_'):
+                calendar = self.observed_holidays_.merged(calendar)
+                first, last = min(first, self.date_range_[0]), max(last, self.date_range_[1])
+            self._fit_calendar(calendar, first, last)
+        return self
+
+    def _fit_calendar(self, calendar, first, last):
+        # holidays found in the data and the first / last date, kept for partial_fit
+        self.observed_holidays_ = calendar
+        self.date_range_ = (int(first), int(last))
+        if self.holidays is not None:
+            calendar = calendar.with_holidays(date_ordinals(self.holidays)[0])
+
+        # dense date -> feature table pickled with the pipeline, so serving is an index lookup
+        self.holiday_calendar_ = calendar
+        self.calendar_table_ = CalendarTable(first, last + self.horizon_days, calendar)
+
+    @timed()
+    def transform(self, X):
+        logger.info("Extracting new features")
+
+        if 'Date' in X.columns:
+            if self.n_jobs not in (None, 1) and hasattr(self, 'calendar_table_') and 'Store' in X.columns:
+                # every date feature only depends on the row's own date (and group), so groups
+                # of stores are transformed in parallel and written back in the rows' order
+                columns = ['Store', 'DayOfWeek', 'Date', 'StateHoliday']
+                if self.holiday_group is not None and self.holiday_group not in columns:
+                    columns.append(self.holiday_group)
+                for name, values in partitioned_columns(X, self._add_features, columns, n_jobs=self.n_jobs).items():
+                    X[name] = values
+            else:
+                self._add_features(X)
+
+            # Drop the 'Date' column after extraction if it's not needed anymore
+            X = X.drop(columns=['Date'])
+
+        return X
+
+    def _add_features(self, X):
+        """Add the date features to X and return them as {name: values}."""
+        columns = set(X.columns)
+        # Calculate whether it's the weekend
+        X['Weekend'] = (X['DayOfWeek'] >= 6).astype(int)
+
+        # MonthPosition (label encoded), days since the start of the year and the holiday
+        # distances, looked up per unique date in the fitted table and broadcast back to the rows
+        if hasattr(self, 'calendar_table_'):
+            add_date_features(X, group_column=self.holiday_group,
+                              calendar=self.holiday_calendar_, table=self.calendar_table_)
+        else:
+            # not fitted: derive the holidays from this batch like before
+            add_date_features(X, group_column=self.holiday_group)
+        return {name: X[name].to_numpy() for name in X.columns if name not in columns}
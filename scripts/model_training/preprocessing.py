@@ -1,8 +1,13 @@
-import pandas as pd
 import logging
 import os
+import sys
 from sklearn.preprocessing import LabelEncoder
-import numpy as np
+from calendar_features import DateDictionary, HolidayCalendar, MONTH_POSITION_LABELS, add_holiday_distances, date_ordinals
+from parallel_features import partitioned_columns
+
+# the shared data loader lives one level up in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_loader import load_rossmann
 
 
 
@@ -42,10 +47,10 @@ logger.addHandler(info_handler)
 logger.addHandler(error_handler)
 
 
-def load_data(path):
+def load_data(path, columns=None, cache=True):
     logger.info("loadding the data set")
     try:
-        train = pd.read_csv(path)
+        train = load_rossmann(path, columns=columns, cache=cache)
         logger.info("the data sucessfully uploaded")
         return train
     except Exception  as e:
@@ -60,26 +65,52 @@ def catagorical_to_numerical(data,column):
         data[column] = LabelEncoder().fit_transform(data[column])
     except Exception as e:
         logger.error(f"error happened : {e}")
-def extract_new_features(train):
+def _date_columns(train, calendar):
+    # the per-row columns of extract_new_features for any subset of the rows (MonthPosition as codes)
+    dates = DateDictionary(train['Date'])
+    columns = {
+        'Date': dates.datetimes(),
+        'Weekend': (train['DayOfWeek'] >= 6).astype(int).to_numpy(),
+        'MonthPosition': dates.broadcast(dates.features()['MonthPosition']),
+    }
+    columns['DaysToNextHoliday'], columns['DaysAfterHoliday'] = calendar.distances(
+        dates.broadcast(dates.ordinals), valid=dates.broadcast(dates.valid))
+    return columns
+
+def extract_new_features(train, n_jobs=None):
     logger.info("extracting new featuires")
     try:
-        logger.info("date changing to datetime")
-        train['Date'] = pd.to_datetime(train['Date'])
-        logger.info("date changinged to datetime succesfully")
-
-        logger.info("extrating weekend")
-        train['Weekend'] = train['DayOfWeek'].apply(lambda x: 1 if x >= 6 else 0)
-        logger.info("extrating weekend succesfull")
+        if n_jobs not in (None, 1):
+            logger.info("extracting the date features in parallel over groups of stores")
+            # the holidays come from the whole frame, the workers only look them up
+            calendar = HolidayCalendar.from_frame(train)
+            columns = partitioned_columns(train, lambda rows: _date_columns(rows, calendar),
+                                          ['Store', 'DayOfWeek', 'Date', 'StateHoliday'], n_jobs=n_jobs)
+            columns['MonthPosition'] = MONTH_POSITION_LABELS[columns['MonthPosition']]
+            for name, values in columns.items():
+                train[name] = values
+            logger.info("date features extracted")
+        else:
+            logger.info("date changing to datetime")
+            # parse every unique date once and broadcast back to the rows
+            dates = DateDictionary(train['Date'])
+            train['Date'] = dates.datetimes()
+            logger.info("date changinged to datetime succesfully")
+
+            logger.info("extrating weekend")
+            train['Weekend'] = (train['DayOfWeek'] >= 6).astype(int)
+            logger.info("extrating weekend succesfull")
         
-        logger.info("month postioning")
-        # MonthPosition (Start = 1-10, Mid = 11-20, End = 21+)
-        train['MonthPosition'] = train['Date'].dt.day.apply(lambda x: 'Start' if x <= 10 else ('Mid' if x <= 20 else 'End'))
-        logger.info("month postioning finished")
+            logger.info("month postioning")
+            # MonthPosition (Start = 1-10, Mid = 11-20, End = 21+)
+            month_position = dates.features()['MonthPosition']
+            train['MonthPosition'] = dates.broadcast(MONTH_POSITION_LABELS[month_position])
+            logger.info("month postioning finished")
 
-        logger.info("calcuating the days to next holiday and after holidat")
+            logger.info("calcuating the days to next holiday and after holidat")
 
-        logger.info("days are calculated sucsesfully")
-        holiday_dates(train)
+            logger.info("days are calculated sucsesfully")
+            holiday_dates(train)
         logger.info("calculating sales growth")
 
         # Step 4: Calculate sales growth rate (percentage change of sales over time)
@@ -89,38 +120,21 @@ def extract_new_features(train):
         logger.info("calculating sales growth complete")
     except Exception as e:
         logger.error(f"error while {e}")
-def holiday_dates(train):
+def holiday_dates(train, group_column=None):
     logger.info("finding the holiday days in the data set")
     try:
-        all_holiday_dates= train[(train['StateHoliday'] != 0)]['Date'].unique()
+        calendar = HolidayCalendar.from_frame(train, group_column=group_column)
         logger.info("all holidays found")
-        holidays = pd.to_datetime(all_holiday_dates)  
-        # Apply the function to calculate DaysToNextHoliday
-        train['DaysToNextHoliday'] = train['Date'].apply(lambda x: days_to_next_holiday(x, holidays))
-
-        # Calculate number of days since the most recent holiday
-        train['DaysAfterHoliday'] = train['Date'].apply(lambda x: (x - holidays[holidays <= x].max()).days if any(holidays <= x) else np.nan)
+        # DaysToNextHoliday and the number of days since the most recent holiday in one pass
+        add_holiday_distances(train, calendar, group_column=group_column)
 
         return train
     except Exception as e:
         logger.error(f"error occured : {e} ")
 # Calculate number of days until the next holiday
 def days_to_next_holiday(date, holidays):
-    holidays = pd.Series(holidays)
-    # Filter holidays for the same year or later
-    future_holidays = holidays[holidays >= date]
-    
-    # If there's a future holiday this year, calculate the days
-    if len(future_holidays) > 0:
-        return (future_holidays.min() - date).days
-    else:
-        #  # If no future holiday exists, find the earliest holiday from the next year
-        # next_year = date.year + 1
-        # next_year_holidays = holidays[holidays.dt.year == next_year]
-        
-        # if len(next_year_holidays) > 0:
-        #     next_year_first_holiday = next_year_holidays.min()
-        #     return (next_year_first_holiday - date).days
-        # else:
-        return -1  # Handle the case where there are no holidays even in the next year
-
+    ordinals, _ = date_ordinals(holidays)
+    date_ordinal, _ = date_ordinals([date])
+    days_to_next, _ = HolidayCalendar(ordinals).distances(date_ordinal)
+    # -1 when there are no holidays left after the date
+    return int(days_to_next[0])
@@ -0,0 +1,188 @@
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables the halving searches)
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import HalvingGridSearchCV, HalvingRandomSearchCV, ParameterGrid, train_test_split
+from sklearn.pipeline import Pipeline
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from profiling import record, span
+
+logger = logging.getLogger(__name__)
+
+# A wider space than the exhaustive grid in pipeline.main; it stays affordable because
+# most candidates are only trained on a fraction of the rows (or trees)
+HALVING_PARAM_GRID = {
+    'model__n_estimators': [50, 100, 200, 400],
+    'model__max_depth': [None, 10, 20, 30],
+    'model__min_samples_split': [2, 5, 10, 20],
+    'model__min_samples_leaf': [1, 2, 4],
+    'model__max_features': [1.0, 0.5, 'sqrt'],
+}
+
+
+# forest sizes at which the warm-started forests are scored
+WARM_START_CHECKPOINTS = [100, 200, 300, 400]
+
+
+def _short_params(params):
+    return str({name.split('__')[-1]: value for name, value in params.items()})
+
+
+def record_search(search):
+    """Add a span per candidate of a fitted search to the current profile, read from cv_results_.
+
+    cv_results_ only keeps the mean and standard deviation of the fit and score seconds
+    over the folds, so a candidate's span lasts n_splits times their mean and carries the
+    test score of every fold.
+    """
+    results = search.cv_results_
+    n_splits = search.n_splits_
+    for candidate, params in enumerate(results['params']):
+        attributes = {
+            'mean_test_score': float(results['mean_test_score'][candidate]),
+            'mean_fit_seconds': float(results['mean_fit_time'][candidate]),
+            'std_fit_seconds': float(results['std_fit_time'][candidate]),
+            'mean_score_seconds': float(results['mean_score_time'][candidate]),
+            'fold_test_scores': [float(results[f'split{fold}_test_score'][candidate]) for fold in range(n_splits)],
+        }
+        if 'n_resources' in results:
+            attributes['n_resources'] = int(results['n_resources'][candidate])
+        seconds = (results['mean_fit_time'][candidate] + results['mean_score_time'][candidate]) * n_splits
+        if record(f"candidate {candidate} {_short_params(params)}", float(seconds), **attributes) is None:
+            return
+    if hasattr(search, 'refit_time_'):
+        record('refit', search.refit_time_)
+
+
+def halving_search(estimator, X, y, param_grid=None, resource='n_samples', max_resources=None,
+                   factor=3, n_candidates=None, min_resources='exhaust', cv=5, n_jobs=-1, random_state=42):
+    """Successive halving over the rows (or any estimator parameter such as 'model__n_estimators').
+
+    Every round keeps the best 1/`factor` of the candidates and gives them `factor` times
+    more resources; candidates of a round are evaluated in parallel on `n_jobs` cores.
+    The compute budget is set with `max_resources` (rows or trees of the last round) and
+    `n_candidates` (sample that many candidates from the grid instead of trying them all).
+    The first round gets just enough resources (`min_resources='exhaust'`) for the last
+    one to reach `max_resources`, whatever the number of candidates.
+    """
+    param_grid = dict(param_grid or HALVING_PARAM_GRID)
+    # the resource itself is grown by the search, it can't be a searched parameter
+    param_grid.pop(resource, None)
+    if max_resources is None:
+        max_resources = 'auto' if resource == 'n_samples' else max(HALVING_PARAM_GRID.get(resource, [400]))
+
+    options = dict(resource=resource, max_resources=max_resources, min_resources=min_resources, factor=factor,
+                   cv=cv, scoring='neg_mean_squared_error', n_jobs=n_jobs, random_state=random_state)
+    if n_candidates is None:
+        search = HalvingGridSearchCV(estimator, param_grid, **options)
+    else:
+        search = HalvingRandomSearchCV(estimator, param_grid, n_candidates=n_candidates, **options)
+
+    logger.info(f"Running successive halving over '{resource}' with factor {factor}")
+    with span('halving_search', rows=len(X), resource=resource, factor=factor):
+        search.fit(X, y)
+        record_search(search)
+    logger.info(f"Successive halving finished after {search.n_iterations_} rounds, "
+                f"resources per round: {search.n_resources_}")
+    return search
+
+
+def cost_report(search):
+    """Per candidate: rounds survived, resources of its last round, total fit + score seconds and score."""
+    results = pd.DataFrame(search.cv_results_)
+    # the resource shows up in params when it's an estimator parameter, it isn't part of the candidate
+    results['candidate'] = [str({name: value for name, value in params.items() if name != search.resource})
+                            for params in results['params']]
+    results['cost_seconds'] = (results['mean_fit_time'] + results['mean_score_time']) * search.n_splits_
+    report = results.sort_values('iter').groupby('candidate').agg(
+        rounds=('iter', 'count'),
+        n_resources=('n_resources', 'max'),
+        cost_seconds=('cost_seconds', 'sum'),
+        mean_test_score=('mean_test_score', 'last'),
+    ).sort_values(['rounds', 'mean_test_score'], ascending=False)
+
+    logger.info(f"Search cost: {report['cost_seconds'].sum():.1f} seconds of fitting and scoring "
+                f"over {len(report)} candidates")
+    return report
+
+
+def warm_start_search(estimator, X, y, param_grid=None, checkpoints=None, oob=True,
+                      validation_fraction=0.2, random_state=42):
+    """Tune n_estimators for free by growing one warm-started forest per other candidate.
+
+    `estimator` is a Pipeline ending in a RandomForestRegressor step; the steps before it are
+    fitted once. Every candidate of `param_grid` (without n_estimators) grows a single forest
+    through `checkpoints`, keeping its earlier trees, and is scored at each checkpoint on the
+    out-of-bag predictions (`oob=True`) or on a held-out `validation_fraction` of the rows.
+    Returns the fitted pipeline with the best forest cut to its best size, the best
+    parameters and the accuracy-vs-trees curves.
+    """
+    checkpoints = sorted(checkpoints or WARM_START_CHECKPOINTS)
+    step, forest = estimator.steps[-1]
+    param_grid = {name.split('__', 1)[1]: values for name, values in (param_grid or HALVING_PARAM_GRID).items()
+                  if name != f'{step}__n_estimators'}
+
+    if oob:
+        X_fit, y_fit = X, y
+    else:
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=validation_fraction, random_state=random_state)
+    prefix = clone(Pipeline(estimator.steps[:-1]))
+    with span('fit_prefix', rows=len(X_fit)):
+        X_fit = prefix.fit_transform(X_fit)
+        if not oob:
+            X_val = prefix.transform(X_val)
+
+    curves = []
+    best = None
+    for candidate, params in enumerate(ParameterGrid(param_grid)):
+        logger.info(f"Growing a forest for {params}")
+        model = clone(forest).set_params(warm_start=True, oob_score=oob, **params)
+        predictions = 0.0
+        fit_seconds = 0.0
+        with span(f"candidate {candidate} {params}", rows=len(X_fit)):
+            for n_estimators in checkpoints:
+                with span(f"n_estimators {n_estimators}", rows=len(X_fit)) as checkpoint:
+                    start = time.perf_counter()
+                    grown = len(getattr(model, 'estimators_', []))
+                    model.set_params(n_estimators=n_estimators).fit(X_fit, y_fit)
+                    fit_seconds += time.perf_counter() - start
+                    if oob:
+                        mse = mean_squared_error(y_fit, model.oob_prediction_)
+                    else:
+                        # only the new trees are evaluated, the earlier ones' predictions are kept as a sum
+                        predictions = predictions + np.sum([tree.predict(np.asarray(X_val, dtype=np.float32))
+                                                            for tree in model.estimators_[grown:]], axis=0)
+                        mse = mean_squared_error(y_val, predictions / n_estimators)
+                    checkpoint.attributes = {'mse': mse}
+                curves.append({**params, 'n_estimators': n_estimators, 'mse': mse, 'fit_seconds': fit_seconds})
+                if best is None or mse < best[0]:
+                    best = (mse, params, n_estimators, model)
+
+    mse, params, n_estimators, model = best
+    # keep the trees grown up to the best checkpoint only
+    model.estimators_ = model.estimators_[:n_estimators]
+    model.set_params(n_estimators=n_estimators, warm_start=False)
+    best_params = {f'{step}__{name}': value for name, value in {**params, 'n_estimators': n_estimators}.items()}
+    logger.info(f"Best warm-start forest: {best_params} with MSE {mse}")
+    return Pipeline(prefix.steps + [(step, model)]), best_params, pd.DataFrame(curves)
+
+
+def plot_warm_start_curves(curves):
+    """Validation MSE against the number of trees, one line per candidate."""
+    import matplotlib.pyplot as plt
+
+    parameters = [column for column in curves.columns if column not in ('n_estimators', 'mse', 'fit_seconds')]
+    plt.figure(figsize=(10, 6))
+    for values, curve in curves.groupby(parameters, dropna=False):
+        plt.plot(curve['n_estimators'], curve['mse'], marker='o', label=str(dict(zip(parameters, values))))
+    plt.title('Validation MSE by number of trees')
+    plt.xlabel('n_estimators')
+    plt.ylabel('MSE')
+    plt.legend(fontsize='small')
+    plt.show()
@@ -0,0 +1,105 @@
+import logging
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.pipeline import Pipeline
+from backends import model_steps
+
+# the shared data loader lives one level up in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_loader import load_rossmann
+
+logger = logging.getLogger(__name__)
+
+
+def store_shards(path, column='StoreType'):
+    """Store -> shard mapping from a column of store.csv, e.g. one shard per StoreType."""
+    stores = load_rossmann(path, 'store', columns=['Store', column])
+    return dict(zip(stores['Store'].tolist(), stores[column].astype(object).tolist()))
+
+
+def _fit_shard(estimator, matrix_path, target_path, start, end):
+    # the panel is sorted by shard, so a shard is a contiguous block of the shared memory map
+    X = np.load(matrix_path, mmap_mode='r')
+    y = np.load(target_path, mmap_mode='r')
+    return clone(estimator).fit(X[start:end], y[start:end])
+
+
+class ShardedRegressor(BaseEstimator, RegressorMixin):
+    """One model per store (or per group of stores), routed by the shard column at predict time.
+
+    Replaces the scaler and model steps of the pipeline: every shard gets its own
+    scaler + `backend` model. `shards` maps the values of `shard_column` to a shard key
+    (see `store_shards`); without it every value is its own shard. Shards are trained in
+    parallel on `n_jobs` processes that share one memory-mapped copy of the features.
+    """
+    def __init__(self, backend='random_forest', model_params=None, shard_column='Store', shards=None, n_jobs=-1):
+        self.backend = backend
+        self.model_params = model_params
+        self.shard_column = shard_column
+        self.shards = shards
+        self.n_jobs = n_jobs
+
+    def _keys(self, X):
+        keys = X[self.shard_column]
+        if self.shards is not None:
+            keys = keys.map(self.shards)
+        return keys.to_numpy()
+
+    def _fit_shards(self, X, y):
+        codes, keys = pd.factorize(self._keys(X), sort=True)
+        # rows without a shard (store missing from the mapping) sort first and are skipped
+        order = np.argsort(codes, kind='stable')[np.count_nonzero(codes < 0):]
+        if len(order) < len(codes):
+            logger.warning(f"{len(codes) - len(order)} rows have no shard and are not used for training")
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        estimator = Pipeline(model_steps(self.backend, **(self.model_params or {})))
+
+        with tempfile.TemporaryDirectory() as directory:
+            matrix_path = os.path.join(directory, 'features.npy')
+            target_path = os.path.join(directory, 'target.npy')
+            np.save(matrix_path, X[self.columns_].to_numpy(dtype=np.float64)[order])
+            np.save(target_path, np.asarray(y, dtype=np.float64)[order])
+
+            logger.info(f"Training {len(keys)} shards")
+            models = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_shard)(estimator, matrix_path, target_path, bounds[i], bounds[i + 1])
+                for i in range(len(keys))
+            )
+        return dict(zip(keys.tolist(), models))
+
+    def fit(self, X, y):
+        self.columns_ = list(X.columns)
+        # shards unknown at fit time are predicted as the average sales
+        self.fallback_ = float(np.mean(y))
+        self.models_ = self._fit_shards(X, y)
+        logger.info(f"Sharded model trained: {len(self.models_)} shards")
+        return self
+
+    def refit_shards(self, X, y):
+        """Retrain only the shards present in X (e.g. one refreshed store), keeping the others."""
+        self.models_.update(self._fit_shards(X, y))
+        return self
+
+    def predict(self, X):
+        matrix = X[self.columns_].to_numpy(dtype=np.float64)
+        codes, keys = pd.factorize(self._keys(X))
+        # group the rows by shard so every shard model is called once, on all of its rows
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+        y_pred = np.full(len(matrix), self.fallback_)
+        unknown = []
+        for i, key in enumerate(keys.tolist()):
+            rows = order[bounds[i]:bounds[i + 1]]
+            model = self.models_.get(key)
+            if model is None:
+                unknown.append(key)
+                continue
+            y_pred[rows] = model.predict(matrix[rows])
+        if unknown:
+            logger.warning(f"No model for the shards {unknown}, predicting the average sales")
+        return y_pred
@@ -0,0 +1,342 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, RegressorMixin, TransformerMixin, clone
+from sklearn.linear_model import SGDRegressor
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from pipeline_steps import CategoricalToNumerical, FeatureExtractor
+from model_registry import publish_model
+
+# the shared data loader lives one level up in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data_loader import read_rossmann_chunks
+from profiling import profile_run, span
+
+logger = logging.getLogger(__name__)
+
+# Out-of-core training for files larger than memory. The csv is read a chunk at a time:
+#   1. the category codes and the holiday calendar are learned with partial_fit
+#   2. every chunk is encoded and its features spooled to disk as float32 with a random fold
+#      per row, while the missing-value fill, the stores' mean sales (per fold) and the target
+#      scaler are learned with partial_fit
+#   3. the feature scaler is learned over the spooled chunks, once the steps before it are final
+#   4. the model is trained with partial_fit over the spooled chunks for `epochs` passes, on the
+#      features transformed like the saved pipeline does, except that a row's store sales come
+#      from the other folds (out-of-fold), and the scaled target
+#   5. the last `validation_days` days (held out of 2 to 4) are scored
+# Memory stays at a few chunks whatever the length of the history.
+
+# models that learn incrementally with partial_fit
+STREAMING_MODELS = {
+    'sgd': lambda **params: SGDRegressor(**{'random_state': 42, **params}),
+    'mlp': lambda **params: MLPRegressor(**{'hidden_layer_sizes': (64, 32), 'random_state': 42, **params}),
+}
+
+
+class FillMissing(BaseEstimator, TransformerMixin):
+    """Replace NaN (DaysAfterHoliday before the first holiday) by the column mean, learnable in chunks."""
+
+    def partial_fit(self, X, y=None):
+        values = np.asarray(X, dtype=np.float64)
+        if not hasattr(self, 'sums_'):
+            self.sums_ = np.zeros(values.shape[1])
+            self.counts_ = np.zeros(values.shape[1])
+        self.sums_ += np.nansum(values, axis=0)
+        self.counts_ += np.sum(~np.isnan(values), axis=0)
+        self.means_ = np.divide(self.sums_, self.counts_, out=np.zeros_like(self.sums_), where=self.counts_ > 0)
+        return self
+
+    def fit(self, X, y=None):
+        for name in ['sums_', 'counts_']:
+            self.__dict__.pop(name, None)
+        return self.partial_fit(X)
+
+    def transform(self, X):
+        values = np.array(X, dtype=np.float64)
+        missing = np.isnan(values)
+        values[missing] = np.broadcast_to(self.means_, values.shape)[missing]
+        if isinstance(X, pd.DataFrame):
+            return pd.DataFrame(values, columns=X.columns, index=X.index)
+        return values
+
+
+class StoreSales(BaseEstimator, TransformerMixin):
+    """Mean sales of the row's store on open days, learnable in chunks.
+
+    The forests split on the Store id; the linear and neural models can't use it as a
+    number, so it is replaced by the store's sales level: StoreSales, the level on open days
+    (OpenStoreSales) and on promo days (PromoStoreSales). Unknown stores get the overall mean.
+
+    The sums are kept per fold of the training rows (`folds`, 0 to n_folds - 1) so the
+    model is trained on out-of-fold levels (`transform_out_of_fold`): a row's own sales
+    never take part in its feature. `transform` uses all the folds.
+    """
+
+    def __init__(self, n_folds=5):
+        self.n_folds = n_folds
+
+    def partial_fit(self, X, y, folds=None):
+        is_open = (X['Open'] == 1).to_numpy()
+        stores = X['Store'].to_numpy().astype(np.int64)[is_open]
+        sales = np.asarray(y, dtype=np.float64)[is_open]
+        folds = np.zeros(len(X), dtype=np.int64) if folds is None else np.asarray(folds, dtype=np.int64)
+        folds = folds[is_open]
+        if hasattr(self, 'stores_'):
+            # merged with the stores seen so far
+            stores = np.concatenate([np.repeat(self.stores_, self.n_folds), stores])
+            folds = np.concatenate([np.tile(np.arange(self.n_folds), len(self.stores_)), folds])
+            counts = np.concatenate([self.counts_.T.ravel(), np.ones(len(sales))])
+            sales = np.concatenate([self.sums_.T.ravel(), sales])
+        else:
+            counts = np.ones(len(sales))
+        stores, codes = np.unique(stores, return_inverse=True)
+        # (fold, store) sums and counts
+        cells = folds * len(stores) + codes
+        size = self.n_folds * len(stores)
+        self.sums_ = np.bincount(cells, weights=sales, minlength=size).reshape(self.n_folds, len(stores))
+        self.counts_ = np.bincount(cells, weights=counts, minlength=size).reshape(self.n_folds, len(stores))
+        self.stores_ = stores
+        return self
+
+    def fit(self, X, y, folds=None):
+        for name in ['stores_', 'sums_', 'counts_']:
+            self.__dict__.pop(name, None)
+        return self.partial_fit(X, y, folds)
+
+    def _positions(self, X):
+        stores = X['Store'].to_numpy().astype(np.int64)
+        position = np.minimum(np.searchsorted(self.stores_, stores), len(self.stores_) - 1)
+        return position, self.stores_[position] == stores
+
+    def _add_levels(self, X, level):
+        X['StoreSales'] = level
+        X['OpenStoreSales'] = X['Open'] * X['StoreSales']
+        X['PromoStoreSales'] = X['Promo'] * X['OpenStoreSales']
+        return X.drop(columns=['Store'])
+
+    def transform(self, X):
+        position, known = self._positions(X)
+        sums, counts = self.sums_.sum(axis=0), self.counts_.sum(axis=0)
+        level = np.full(len(X), sums.sum() / max(counts.sum(), 1))
+        level[known] = sums[position[known]] / np.maximum(counts[position[known]], 1)
+        return self._add_levels(X, level)
+
+    def transform_out_of_fold(self, X, folds):
+        """Like transform, with the level of every row learned from the folds other than its own."""
+        folds = np.asarray(folds, dtype=np.int64)
+        position, known = self._positions(X)
+        sums = self.sums_.sum(axis=0)[position] - self.sums_[folds, position]
+        counts = self.counts_.sum(axis=0)[position] - self.counts_[folds, position]
+        other_sums = self.sums_.sum() - self.sums_.sum(axis=1)[folds]
+        other_counts = self.counts_.sum() - self.counts_.sum(axis=1)[folds]
+        # the overall mean of the other folds for stores they don't have
+        level = other_sums / np.maximum(other_counts, 1)
+        known &= counts > 0
+        level[known] = sums[known] / counts[known]
+        return self._add_levels(X, level)
+
+
+class ScaledTargetRegressor(BaseEstimator, RegressorMixin):
+    """A regressor trained on the standardized target, predicting in the target's units.
+
+    TransformedTargetRegressor with a StandardScaler, learnable in chunks: the target
+    scaler is learned with partial_fit_target over every chunk first, then the regressor
+    with partial_fit.
+    """
+
+    def __init__(self, regressor):
+        self.regressor = regressor
+
+    def _scaled(self, y):
+        return self.target_scaler_.transform(np.asarray(y, dtype=np.float64).reshape(-1, 1)).ravel()
+
+    def fit(self, X, y):
+        self.target_scaler_ = StandardScaler().fit(np.asarray(y, dtype=np.float64).reshape(-1, 1))
+        self.regressor_ = clone(self.regressor).fit(X, self._scaled(y))
+        return self
+
+    def partial_fit_target(self, y):
+        if not hasattr(self, 'target_scaler_'):
+            self.target_scaler_ = StandardScaler()
+        self.target_scaler_.partial_fit(np.asarray(y, dtype=np.float64).reshape(-1, 1))
+        return self
+
+    def partial_fit(self, X, y):
+        if not hasattr(self, 'regressor_'):
+            self.regressor_ = clone(self.regressor)
+        self.regressor_.partial_fit(X, self._scaled(y))
+        return self
+
+    def predict(self, X):
+        return self.target_scaler_.inverse_transform(self.regressor_.predict(X).reshape(-1, 1)).ravel()
+
+
+def read_training_chunks(path, chunk_size=100_000):
+    """(X, y) of every chunk of a training csv, prepared like pipeline_withotgrid.prepare_data."""
+    for chunk in read_rossmann_chunks(path, kind='train', chunksize=chunk_size):
+        chunk = chunk.drop(columns=['Unnamed: 0', 'Id', 'Customers'], errors='ignore')
+        yield chunk.drop(columns=['Sales']), chunk['Sales']
+
+
+def _features(encoder, extractor, X, y):
+    # the encoder drops rows with missing values, the target follows the rows that are left
+    features = extractor.transform(encoder.transform(X))
+    return features, y.loc[features.index]
+
+
+def fit_streaming(path, model='sgd', chunk_size=100_000, epochs=3, validation_days=42, spool_dir=None,
+                  random_state=42, **params):
+    """Train the preprocessing and a partial_fit model on a csv one chunk at a time.
+
+    Returns the fitted Pipeline (same preprocessing steps as build_pipeline, then the
+    missing-value fill, the stores' sales levels, the scaler and the model trained on the
+    scaled target) and the metrics on the held-out last days.
+    """
+    if model not in STREAMING_MODELS:
+        raise ValueError(f"Unknown streaming model '{model}', expected one of {list(STREAMING_MODELS)}")
+    encoder = CategoricalToNumerical(drop_missing=True)
+    extractor = FeatureExtractor()
+    fill = FillMissing()
+    store_sales = StoreSales()
+    scaler = StandardScaler()
+    regressor = ScaledTargetRegressor(STREAMING_MODELS[model](**params))
+    rng = np.random.default_rng(random_state)
+
+    logger.info(f"Learning the category codes and the holiday calendar from {path} in chunks of {chunk_size} rows")
+    with span('fit_preprocessing') as stage:
+        rows = 0
+        last_date = None
+        for X, _ in read_training_chunks(path, chunk_size):
+            encoder.partial_fit(X)
+            extractor.partial_fit(X)
+            chunk_last = X['Date'].max()
+            last_date = chunk_last if last_date is None else max(last_date, chunk_last)
+            rows += len(X)
+        stage.rows = rows
+    if not rows:
+        raise ValueError(f"No rows in {path}")
+    # the most recent days are held out, like the forecast horizon
+    cutoff = last_date - pd.Timedelta(days=validation_days)
+    logger.info(f"{rows} rows read, training on the days up to {cutoff.date()}")
+
+    with tempfile.TemporaryDirectory(dir=spool_dir) as directory:
+        spooled = []
+        train_rows = 0
+        with span('spool_features') as stage:
+            for index, (X, y) in enumerate(read_training_chunks(path, chunk_size)):
+                train = (X['Date'] <= cutoff).to_numpy()
+                features, y = _features(encoder, extractor, X.loc[train].copy(), y.loc[train])
+                if not len(features):
+                    continue
+                folds = rng.integers(store_sales.n_folds, size=len(features))
+                fill.partial_fit(features)
+                store_sales.partial_fit(features, y, folds)
+                regressor.partial_fit_target(y)
+                # the features before the fill: its means are only final once every chunk was seen
+                chunk_path = os.path.join(directory, f'chunk-{index}.npy')
+                np.save(chunk_path, np.column_stack([features.to_numpy(dtype=np.float64), folds, y.to_numpy()])
+                        .astype(np.float32))
+                spooled.append(chunk_path)
+                feature_names = list(features.columns)
+                train_rows += len(features)
+            stage.rows = train_rows
+        if not spooled:
+            raise ValueError(f"No training rows before {cutoff.date()} in {path}")
+        logger.info(f"Features of {train_rows} training rows spooled to {len(spooled)} chunks")
+
+        def model_input(chunk):
+            # the spooled features through the steps of the saved pipeline before the scaler,
+            # with the stores' sales learned out-of-fold
+            features = fill.transform(pd.DataFrame(chunk[:, :-2], columns=feature_names))
+            return store_sales.transform_out_of_fold(features, chunk[:, -2])
+
+        with span('fit_scaler', rows=train_rows):
+            for chunk_path in spooled:
+                scaler.partial_fit(model_input(np.load(chunk_path)))
+
+        for epoch in range(epochs):
+            with span(f'epoch {epoch}', rows=train_rows):
+                # chunks in a new order every epoch, and rows shuffled within a chunk
+                for chunk_path in rng.permutation(spooled):
+                    chunk = np.load(chunk_path)
+                    chunk = chunk[rng.permutation(len(chunk))]
+                    regressor.partial_fit(scaler.transform(model_input(chunk)), chunk[:, -1])
+            logger.info(f"Epoch {epoch + 1}/{epochs} done")
+
+    pipeline = Pipeline([
+        ('categorical_to_numerical', encoder),
+        ('feature_extractor', extractor),
+        ('fill_missing', fill),
+        ('store_sales', store_sales),
+        ('scaler', scaler),
+        ('model', regressor),
+    ])
+
+    with span('evaluate') as stage:
+        metrics = evaluate_streaming(pipeline, path, cutoff, chunk_size)
+        stage.rows = metrics['rows']
+    return pipeline, metrics
+
+
+def evaluate_streaming(pipeline, path, cutoff, chunk_size=100_000):
+    """MSE, MAE and R² on the rows after `cutoff`, accumulated chunk by chunk."""
+    n = 0
+    squared = absolute = total = total_squared = 0.0
+    for X, y in read_training_chunks(path, chunk_size):
+        held_out = (X['Date'] > cutoff).to_numpy()
+        if not held_out.any():
+            continue
+        X = X.loc[held_out].copy()
+        y_pred = pipeline.predict(X)
+        # predict drops the rows the encoder can't use, like in training
+        y = y.loc[X.index].to_numpy(dtype=np.float64)
+        n += len(y)
+        squared += np.sum((y - y_pred) ** 2)
+        absolute += np.sum(np.abs(y - y_pred))
+        total += y.sum()
+        total_squared += np.sum(y ** 2)
+    if not n:
+        return {'rows': 0, 'mse': None, 'mae': None, 'r2': None}
+    variance = total_squared - total ** 2 / n
+    return {'rows': n, 'mse': squared / n, 'mae': absolute / n, 'r2': 1 - squared / variance if variance else None}
+
+
+def main(path, model='sgd', chunk_size=100_000, epochs=3, validation_days=42, registry_dir=None,
+         profile_path=None, **params):
+    try:
+        with profile_run('streaming.main', profile_path, model=model, chunk_size=chunk_size, epochs=epochs):
+            pipeline, metrics = fit_streaming(path, model, chunk_size, epochs, validation_days, **params)
+
+            logger.info(f"Mean Squared Error (MSE): {metrics['mse']}")
+            logger.info(f"Mean Absolute Error (MAE): {metrics['mae']}")
+            logger.info(f"R-squared (R²): {metrics['r2']}")
+            print(f"Mean Squared Error (MSE): {metrics['mse']}")
+            print(f"Mean Absolute Error (MAE): {metrics['mae']}")
+            print(f"R-squared (R²): {metrics['r2']}")
+
+            if registry_dir is not None:
+                with span('publish_model'):
+                    publish_model(pipeline, registry_dir, {'backend': f'streaming_{model}', **metrics})
+            return pipeline
+    except Exception as e:
+        logger.error(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train on a csv larger than memory, one chunk at a time")
+    parser.add_argument('path')
+    parser.add_argument('--model', choices=list(STREAMING_MODELS), default='sgd')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--validation-days', type=int, default=42)
+    parser.add_argument('--registry-dir')
+    parser.add_argument('--profile-path')
+    args = parser.parse_args()
+    main(args.path, args.model, args.chunk_size, args.epochs, args.validation_days, args.registry_dir,
+         args.profile_path)
@@ -0,0 +1,184 @@
+import contextlib
+import contextvars
+import datetime
+import functools
+import json
+import logging
+import os
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# profiles of the training runs are written here unless a path is given
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'profiles')
+
+# innermost open span of the current thread / task, None when nothing is being profiled
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """Wall time, CPU time (of this process) and rows of one stage, with its nested stages."""
+    def __init__(self, name, rows=None, attributes=None):
+        self.name = name
+        self.rows = rows
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.started = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = None
+
+    def __enter__(self):
+        self.started = datetime.datetime.now().isoformat(timespec='milliseconds')
+        self._token = _current.set(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = time.process_time() - self._cpu
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started': self.started,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows': self.rows,
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+class _NullSpan:
+    """Returned when no run is profiled: entering it and setting its rows costs nothing."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, rows=None, **attributes):
+    """Context manager timing its block as a child of the enclosing span.
+
+    A no-op outside of `profile_run`, so instrumented code (e.g. the transformers used by
+    the app) pays nothing when it isn't profiled. Rows can also be set on the span later.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NULL_SPAN
+    child = Span(name, rows, attributes)
+    parent.children.append(child)
+    return child
+
+
+def record(name, wall_seconds, cpu_seconds=None, rows=None, parent=None, **attributes):
+    """Add a stage timed elsewhere (e.g. in a worker process) under `parent` or the current span."""
+    parent = parent if parent is not None else _current.get()
+    if parent is None:
+        return None
+    child = Span(name, rows, attributes)
+    child.wall_seconds = wall_seconds
+    child.cpu_seconds = cpu_seconds
+    parent.children.append(child)
+    return child
+
+
+def _count_rows(args):
+    # the first frame or array argument, skipping self for methods
+    for arg in args:
+        if hasattr(arg, 'shape'):
+            return len(arg)
+    return None
+
+
+def timed(name=None):
+    """Decorator running a function in a span named after it, with the rows of its first frame argument."""
+    def decorator(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(label, rows=_count_rows(args)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary(root):
+    """One row per stage path: calls, total wall / CPU seconds, rows, throughput and share of the run."""
+    stages = {}
+
+    def visit(node, path, depth):
+        path = f"{path}/{node.name}" if path else node.name
+        stage = stages.setdefault(path, {'stage': '  ' * depth + node.name, 'calls': 0, 'wall_seconds': 0.0,
+                                         'cpu_seconds': None, 'rows': None})
+        stage['calls'] += 1
+        stage['wall_seconds'] += node.wall_seconds
+        if node.cpu_seconds is not None:
+            stage['cpu_seconds'] = (stage['cpu_seconds'] or 0.0) + node.cpu_seconds
+        if node.rows is not None:
+            stage['rows'] = (stage['rows'] or 0) + node.rows
+        for child in node.children:
+            visit(child, path, depth + 1)
+
+    visit(root, '', 0)
+    table = pd.DataFrame(list(stages.values()), index=list(stages))
+    table['rows'] = table['rows'].astype('Int64')
+    table['rows_per_second'] = (table['rows'] / table['wall_seconds']).astype(float)
+    table['percent'] = 100 * table['wall_seconds'] / max(root.wall_seconds, 1e-12)
+    table.index.name = 'path'
+    return table
+
+
+def write_profile(root, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(root.to_dict(), f, indent=2, default=str)
+    logger.info(f"Profile written to {path}")
+    return path
+
+
+@contextlib.contextmanager
+def profile_run(name, path=None, **attributes):
+    """Profile a run: every span opened inside ends up in its tree.
+
+    On exit the profile is written as JSON to `path` (PROFILE_DIR/<name>-<timestamp>.json
+    by default) and a summary table is logged and printed. Inside another profiled run
+    this is just a nested span.
+    """
+    if _current.get() is not None:
+        with span(name, **attributes) as nested:
+            yield nested
+        return
+
+    root = Span(name, attributes=attributes)
+    try:
+        with root:
+            yield root
+    finally:
+        if path is None:
+            path = os.path.join(PROFILE_DIR, f"{name}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+        try:
+            write_profile(root, path)
+            table = summary(root).to_string(index=False, float_format=lambda value: f"{value:.3f}")
+            logger.info(f"Profile of {name}:\n{table}")
+            print(table)
+        except Exception as e:
+            # a broken profile must not hide the run's own result or error
+            logger.error(f"Error while writing the profile: {e}")
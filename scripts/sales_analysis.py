@@ -6,6 +6,13 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from statsmodels.tsa.seasonal import seasonal_decompose 
 from statsmodels.tsa.stattools import acf , pacf
+from data_loader import load_rossmann
+# the @timed functions only record spans inside a profiled run, e.g. in a notebook cell:
+#     with sa.profile_run('sales_analysis'):
+#         train, test = sa.load_data(path)
+#         sa.plot_weekly_sales(train)
+# writes scripts/logs/profiles/sales_analysis-<timestamp>.json and prints the time spent in each function
+from profiling import profile_run, timed
 
 
 logging.basicConfig(
@@ -44,18 +51,20 @@ logger.addHandler(info_handler)
 logger.addHandler(error_handler)
 
 
-def load_data(file_path):
+@timed()
+def load_data(file_path, cache=True):
     logger.info('data loading started')
     try:
         data = []
         for p in file_path:
-            n = pd.read_csv(p)
+            n = load_rossmann(p, cache=cache)
             logger.debug(f"the  {n} data is sucessfully loaded")
             data.append(n)
         return data
     except Exception as e:
         logger.error(f"Error loading the data {e}")
         return None
+@timed()
 def set_date_index(data):
     try:
         logger.info('changing the date column to standaed date time format')
@@ -67,6 +76,7 @@ def set_date_index(data):
     except Exception as e:
         logger.error(f' error while making date and index {e}')
 
+@timed()
 def plot_weekly_sales(data):
     logger.info("Plotting weekly sales ...")
     try:
@@ -79,6 +89,7 @@ def plot_weekly_sales(data):
         plt.show()
     except Exception as e:
         logger.error(f"error in ploting weekly sales: {e}")
+@timed()
 def plot_monthly_sales(data):
     logger.info("plotting the monthly sales ...")
     try:
@@ -91,6 +102,7 @@ def plot_monthly_sales(data):
         plt.show()
     except Exception as e:
         logger.error("error while trying to make monthly plot {e}")
+@timed()
 def plot_seasonal_decomposition(data):
     logger.info("Performing seasonal decompotation ....")
     try:
@@ -101,6 +113,7 @@ def plot_seasonal_decomposition(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error during seasonal decomposition : {e}")
+@timed()
 def plot_acf_pacf(data):
     logger.info("Plotting ACF and PACF ...")
     try:
@@ -131,6 +144,7 @@ def plot_acf_pacf(data):
         plt.show()    
     except Exception as e:
         logger.error(f"Error in ploting ACF and PACF: {e}")
+@timed()
 def plot_rolling_statistics(data):
     logger.info("Plotting rolling statistics ..")
     try:
@@ -147,6 +161,7 @@ def plot_rolling_statistics(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in ploting rolling statistics:{e}")
+@timed()
 def plot_day_of_week_sales(data):
     logger.info("PLotting average sales by day of week ..") 
     try:
@@ -160,6 +175,7 @@ def plot_day_of_week_sales(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in plotting day of errk sales: {e}")
+@timed()
 def plot__StateHoliday_sales_distribution(data):
     logger.info("Plotting sales distribution: StateHoliday vs Non Holiday ....")
     try:
@@ -170,6 +186,7 @@ def plot__StateHoliday_sales_distribution(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in ploting holiday sales distribution : {e}")
+@timed()
 def plot__SchoolHoliday_sales_distribution(data):
     logger.info("Plotting sales distribution: SchoolHoliday vs Non Holiday ....")
     try:
@@ -180,6 +197,7 @@ def plot__SchoolHoliday_sales_distribution(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in ploting holiday sales distribution : {e}")
+@timed()
 def plot_general_holiday_as_or_fun(data):
     logger.info("the distribution of sales between holiday either school or state holiday ...")
     try:
@@ -191,6 +209,7 @@ def plot_general_holiday_as_or_fun(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in ploting holiday or state holiday sales distribution : {e}")
+@timed()
 def print_statistics(data):
     logger.ingfo("Prining summary statistics ")
     try:
@@ -204,6 +223,7 @@ def print_statistics(data):
         print(data.groupby("General_holiday")['Sales'].describe())
     except Exception as e:
         logger.info(f"error while priniting statistics: {e}")
+@timed()
 def plot_promo_effect(data):
     logger.info("Plotting promo effect over time .....")
     try:
@@ -218,6 +238,7 @@ def plot_promo_effect(data):
         plt.show()
     except Exception as e:
         logger.error(f"Error in plotting promo effect: {e}")
+@timed()
 def plot_store_type_performance(df):
     logger.info("Plotting store type performance over time...")
     try:
@@ -231,6 +252,7 @@ def plot_store_type_performance(df):
     except Exception as e:
         logger.error(f"Error in plotting store type performance: {e}")
 
+@timed()
 def plot_sales_correlation(df):
     logger.info("Plotting correlation between sales and customers...")
     try:
@@ -240,6 +262,7 @@ def plot_sales_correlation(df):
         plt.show()
     except Exception as e:
         logger.error(f"Error in plotting sales correlation: {e}")
+@timed()
 def plot_cumulative_sales(df):
     logger.info("Plotting cumulative sales over time...")
     try:
@@ -252,6 +275,7 @@ def plot_cumulative_sales(df):
         plt.show()
     except Exception as e:
         logger.error(f"Error in plotting cumulative sales: {e}")
+@timed()
 def plot_sales_growth_rate(df):
     logger.info("Plotting daily sales growth rate...")
     try:
@@ -0,0 +1,258 @@
+import argparse
+import logging
+import os
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+from data_loader import DATE_FORMAT, SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+# Store ids are read as uint16 (see data_loader.SCHEMAS)
+MAX_STORES = np.iinfo(np.uint16).max
+
+# (StateHoliday code, (month, day) or days after Easter Sunday, share of the states observing it),
+# roughly the German public holidays of the Rossmann data
+HOLIDAY_RULES = [
+    ('a', (1, 1), 1.0),     # New Year
+    ('a', (1, 6), 0.25),    # Epiphany
+    ('b', -2, 1.0),         # Good Friday
+    ('b', 1, 1.0),          # Easter Monday
+    ('a', (5, 1), 1.0),     # Labour Day
+    ('a', 39, 1.0),         # Ascension
+    ('a', 50, 1.0),         # Whit Monday
+    ('a', 60, 0.5),         # Corpus Christi
+    ('a', (10, 3), 1.0),    # German Unity Day
+    ('a', (10, 31), 0.4),   # Reformation Day
+    ('a', (11, 1), 0.4),    # All Saints
+    ('c', (12, 25), 1.0),   # Christmas
+    ('c', (12, 26), 1.0),
+]
+
+# customers by day of week, Monday first; stores of type 'b' are the only ones open on Sundays
+WEEKLY_PROFILE = [1.15, 1.0, 0.95, 0.95, 1.0, 0.9, 0.6]
+
+PROMO_INTERVALS = ['Jan,Apr,Jul,Oct', 'Feb,May,Aug,Nov', 'Mar,Jun,Sept,Dec']
+
+
+class SyntheticRossmann:
+    """Random but Rossmann-shaped train/test/store data for any number of stores and days.
+
+    Stores get a type, an assortment, a state and a base level of customers. Every day
+    has the state's public (HOLIDAY_RULES) and school holidays, a promotion every
+    `promo_every_weeks` weeks (Monday to Friday), weekly and yearly seasonality, a
+    December peak and a yearly trend. Sales are customers times a per-store basket,
+    zero when the store is closed (Sundays, holidays and random closures).
+    Rows come in chunks of whole days, so any size can be written without holding it in memory.
+    """
+    def __init__(self, n_stores=1115, start='2013-01-01', end='2015-07-31', test_days=48, n_states=12,
+                 holiday_rules=None, weekly_profile=None, yearly_amplitude=0.08, december_boost=0.35,
+                 trend=0.03, promo_every_weeks=2, promo_uplift=0.25, closed_fraction=0.01, seed=42):
+        if not 1 <= n_stores <= MAX_STORES:
+            raise ValueError(f"n_stores must be between 1 and {MAX_STORES}, Store is read as uint16")
+        self.n_stores = n_stores
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.test_days = test_days
+        self.n_states = n_states
+        self.holiday_rules = HOLIDAY_RULES if holiday_rules is None else holiday_rules
+        self.weekly_profile = np.asarray(WEEKLY_PROFILE if weekly_profile is None else weekly_profile)
+        self.yearly_amplitude = yearly_amplitude
+        self.december_boost = december_boost
+        self.trend = trend
+        self.promo_every_weeks = promo_every_weeks
+        self.promo_uplift = promo_uplift
+        self.closed_fraction = closed_fraction
+        self.seed = seed
+
+        rng = np.random.default_rng([seed, 0])
+        # train days then test days, one row per day
+        self.dates = pd.date_range(self.start, self.end + pd.Timedelta(days=test_days), freq='D')
+        self.n_train_days = int((self.end - self.start).days) + 1
+        self._make_stores(rng)
+        self._make_calendar(rng)
+
+    def _make_stores(self, rng):
+        n = self.n_stores
+        self.store_type = rng.choice(np.array(['a', 'b', 'c', 'd']), n, p=[0.54, 0.02, 0.13, 0.31])
+        self.assortment = np.where(self.store_type == 'b', 'b',
+                                   rng.choice(np.array(['a', 'c']), n, p=[0.53, 0.47]))
+        self.state = rng.integers(0, self.n_states, n)
+        self.base_customers = rng.lognormal(np.log(700), 0.35, n) * np.where(self.store_type == 'b', 2.5, 1.0)
+        self.basket = rng.normal(9.5, 1.2, n).clip(5) * np.where(self.assortment == 'c', 1.1, 1.0)
+
+        distance = rng.lognormal(np.log(2300), 1.2, n).round(-1)
+        distance[rng.random(n) < 0.003] = np.nan
+        competition_known = rng.random(n) > 0.32
+        promo2 = rng.random(n) < 0.5
+        self.stores = pd.DataFrame({
+            'Store': np.arange(1, n + 1),
+            'StoreType': self.store_type,
+            'Assortment': self.assortment,
+            'CompetitionDistance': distance,
+            'CompetitionOpenSinceMonth': np.where(competition_known, rng.integers(1, 13, n), np.nan),
+            'CompetitionOpenSinceYear': np.where(competition_known, rng.integers(2000, self.start.year + 1, n), np.nan),
+            'Promo2': promo2.astype(int),
+            'Promo2SinceWeek': np.where(promo2, rng.integers(1, 53, n), np.nan),
+            'Promo2SinceYear': np.where(promo2, rng.integers(2009, self.start.year + 2, n), np.nan),
+            'PromoInterval': np.where(promo2, rng.choice(np.array(PROMO_INTERVALS), n), None),
+        })
+
+    def _make_calendar(self, rng):
+        n_days = len(self.dates)
+        years = range(self.dates[0].year - 1, self.dates[-1].year + 1)
+
+        def day_index(date):
+            return (pd.Timestamp(date) - self.start).days
+
+        # StateHoliday code of every (day, state)
+        self.holidays = np.full((n_days, self.n_states), '0', dtype='<U1')
+        for code, when, share in self.holiday_rules:
+            states = rng.random(self.n_states) < share
+            for year in years:
+                if isinstance(when, tuple):
+                    date = pd.Timestamp(year, *when)
+                else:
+                    date = pd.Timestamp(easter(year)) + pd.Timedelta(days=when)
+                day = day_index(date)
+                if 0 <= day < n_days:
+                    self.holidays[day, states] = code
+
+        # school holidays of every (day, state): summer (6 weeks starting between late June and
+        # early August, by state), Christmas, two weeks around Easter and a week in October
+        self.school = np.zeros((n_days, self.n_states), dtype=bool)
+        summer_offset = rng.integers(0, 42, self.n_states)
+        autumn_offset = rng.integers(0, 21, self.n_states)
+        for state in range(self.n_states):
+            for year in years:
+                easter_sunday = pd.Timestamp(easter(year))
+                periods = [
+                    (pd.Timestamp(year, 6, 20) + pd.Timedelta(days=int(summer_offset[state])), 42),
+                    (pd.Timestamp(year, 12, 22), 15),
+                    (easter_sunday - pd.Timedelta(days=7), 14),
+                    (pd.Timestamp(year, 10, 5) + pd.Timedelta(days=int(autumn_offset[state])), 9),
+                ]
+                for first, length in periods:
+                    day = day_index(first)
+                    self.school[max(day, 0):max(day + length, 0), state] = True
+
+        self.day_of_week = (self.dates.dayofweek + 1).to_numpy().astype(np.int8)
+        weeks = (self.dates - self.start).days.to_numpy() // 7
+        self.promo = ((weeks % self.promo_every_weeks == 0) & (self.day_of_week <= 5)).astype(np.int8)
+
+        day_of_year = self.dates.dayofyear.to_numpy()
+        season = 1 + self.yearly_amplitude * np.sin(2 * np.pi * (day_of_year - 80) / 365.25)
+        # shopping builds up over the weeks before Christmas
+        december = (self.dates.month == 12) & (self.dates.day <= 24)
+        season += self.december_boost * december * self.dates.day.to_numpy() / 24
+        years_since_start = (self.dates - self.start).days.to_numpy() / 365.25
+        self.day_factor = season * (1 + self.trend) ** years_since_start
+
+    def _rows(self, first_day, last_day, rng, with_sales):
+        """Rows of days [first_day, last_day), latest day first and stores in order like the Kaggle files."""
+        days = np.arange(last_day - 1, first_day - 1, -1)
+        day = np.repeat(days, self.n_stores)
+        store = np.tile(np.arange(self.n_stores), len(days))
+        state = self.state[store]
+        day_of_week = self.day_of_week[day]
+        holiday = self.holidays[day, state]
+        school = self.school[day, state].astype(np.int8)
+        promo = self.promo[day]
+
+        type_b = self.store_type[store] == 'b'
+        closed = (((day_of_week == 7) | (holiday != '0')) & ~type_b) | (rng.random(len(day)) < self.closed_fraction)
+        is_open = (~closed).astype(np.int8)
+        rows = {
+            'Store': (store + 1).astype(np.uint16),
+            'DayOfWeek': day_of_week,
+            'Date': self.dates.to_numpy()[day],
+        }
+        if with_sales:
+            customers = (self.base_customers[store] * self.weekly_profile[day_of_week - 1] * self.day_factor[day]
+                         * (1 + self.promo_uplift * promo) * (1 + 0.05 * school)
+                         * rng.lognormal(0.0, 0.1, len(day)))
+            sales = customers * self.basket[store] * (1 + 0.1 * promo) * rng.lognormal(0.0, 0.05, len(day))
+            rows['Sales'] = (sales * is_open).round().astype(np.int32)
+            rows['Customers'] = (customers * is_open).round().astype(np.int32)
+        rows.update({
+            'Open': is_open,
+            'Promo': promo,
+            'StateHoliday': pd.Categorical(holiday, categories=['0', 'a', 'b', 'c']),
+            'SchoolHoliday': school,
+        })
+        return pd.DataFrame(rows)
+
+    def _chunks(self, first_day, last_day, chunk_rows, with_sales):
+        days_per_chunk = max(1, chunk_rows // self.n_stores)
+        for index, end in enumerate(range(last_day, first_day, -days_per_chunk)):
+            # one random stream per chunk, so a given chunk size always gives the same data
+            rng = np.random.default_rng([self.seed, 1 + with_sales, index])
+            yield self._rows(max(end - days_per_chunk, first_day), end, rng, with_sales)
+
+    def train_chunks(self, chunk_rows=1_000_000):
+        return self._chunks(0, self.n_train_days, chunk_rows, with_sales=True)
+
+    def test_chunks(self, chunk_rows=1_000_000):
+        next_id = 1
+        for chunk in self._chunks(self.n_train_days, len(self.dates), chunk_rows, with_sales=False):
+            chunk.insert(0, 'Id', np.arange(next_id, next_id + len(chunk), dtype=np.int32))
+            chunk['Open'] = chunk['Open'].astype(SCHEMAS['test']['Open'])
+            next_id += len(chunk)
+            yield chunk
+
+    def train_frame(self, n_rows=None):
+        """The first `n_rows` training rows (all by default) in memory, typed like load_rossmann's."""
+        chunks = []
+        total = 0
+        for chunk in self.train_chunks():
+            chunks.append(chunk)
+            total += len(chunk)
+            if n_rows is not None and total >= n_rows:
+                break
+        return pd.concat(chunks, ignore_index=True).iloc[:n_rows]
+
+    def write(self, directory, chunk_rows=1_000_000):
+        """Write train.csv, test.csv and store.csv to `directory` a chunk at a time; returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = {kind: os.path.join(directory, f'{kind}.csv') for kind in ['train', 'test', 'store']}
+        self.stores.to_csv(paths['store'], index=False)
+        for kind, chunks in [('train', self.train_chunks(chunk_rows)), ('test', self.test_chunks(chunk_rows))]:
+            rows = 0
+            with open(paths[kind], 'w', newline='') as f:
+                for chunk in chunks:
+                    chunk.to_csv(f, header=rows == 0, index=False, date_format=DATE_FORMAT)
+                    rows += len(chunk)
+                    logger.info(f"{rows} rows written to {paths[kind]}")
+        return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Rossmann-shaped train/test/store csv files")
+    parser.add_argument('directory')
+    parser.add_argument('--stores', type=int, default=1115)
+    parser.add_argument('--start', default='2013-01-01')
+    parser.add_argument('--end', default='2015-07-31')
+    parser.add_argument('--rows', type=int, help="training rows wanted, sets --end from --start and --stores")
+    parser.add_argument('--test-days', type=int, default=48)
+    parser.add_argument('--states', type=int, default=12)
+    parser.add_argument('--promo-every-weeks', type=int, default=2)
+    parser.add_argument('--yearly-amplitude', type=float, default=0.08)
+    parser.add_argument('--december-boost', type=float, default=0.35)
+    parser.add_argument('--trend', type=float, default=0.03)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    end = args.end
+    if args.rows is not None:
+        end = pd.Timestamp(args.start) + pd.Timedelta(days=-(-args.rows // args.stores) - 1)
+    generator = SyntheticRossmann(args.stores, args.start, end, args.test_days, args.states,
+                                  yearly_amplitude=args.yearly_amplitude, december_boost=args.december_boost,
+                                  trend=args.trend, promo_every_weeks=args.promo_every_weeks, seed=args.seed)
+    paths = generator.write(args.directory, args.chunk_rows)
+    print(paths)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
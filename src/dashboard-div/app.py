@@ -2,72 +2,280 @@ from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS  # Import CORS
 import pandas as pd
 import numpy as np
-import joblib
-import gdown
+import json
 import os
 import sys
 
 # Ensure your custom pipeline script is in the path
 sys.path.append(os.path.abspath('../../scripts/model_training'))
 import pipeline_withotgrid as p  # Ensure this path is correct
+from model_registry import ModelHolder, ModelNotReady, publish_file
+from prediction_cache import PredictionCache
+from micro_batching import MicroBatcher
+from metrics import Metrics, NullMetrics
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for the app
+# largest number of rows accepted by /predict/batch
+app.config['MAX_BATCH_SIZE'] = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+
+# request fields -> pipeline input columns
+input_columns = {
+    'store_id': 'Store',
+    'day_of_week': 'DayOfWeek',
+    'date': 'Date',
+    'open_store': 'Open',
+    'promo': 'Promo',
+    'state_holiday': 'StateHoliday',
+    'school_holiday': 'SchoolHoliday',
+}
+numeric_columns = ['Store', 'DayOfWeek', 'Open', 'Promo', 'SchoolHoliday']
+state_holidays = ['0', 'a', 'b', 'c']
 
 # Google Drive URL and output path for the model file
 model_url = 'https://drive.google.com/uc?export=download&id=1oIVpESdt2JpQDv3qTkdG0NCQRQCx-dG1'
 model_output_path = "final_model.pkl"
+# memory-mappable version of the model (python model_artifact.py final_model.pkl)
+model_artifact_path = "final_model.artifact"
+# local model registry with timestamped versions (see model_registry.py)
+registry_dir = os.environ.get('MODEL_REGISTRY_DIR', 'models')
 
-# Function to download the model from Google Drive if not already downloaded
+# One-off: download the model from Google Drive and publish it to the registry
 def download_model():
+    import gdown
     if not os.path.exists(model_output_path):
         print("Downloading model from Google Drive...")
         gdown.download(model_url, model_output_path, quiet=False)
+    return publish_file(model_output_path, registry_dir)
+
+def warmup(model):
+    # a first prediction pages in the model and fails early on a broken one
+    model.predict(pd.DataFrame({'Store': [1], 'DayOfWeek': [1], 'Date': [pd.Timestamp('2015-08-03')], 'Open': [1],
+                                'Promo': [0], 'StateHoliday': ['0'], 'SchoolHoliday': [0]}))
+
+# loaded in the background, then the registry is polled and a newly activated version swapped in;
+# a fresh registry is first seeded with the model files already next to the app
+model_holder = ModelHolder(registry_dir, warmup, float(os.environ.get('MODEL_POLL_SECONDS', 5)),
+                           seed_paths=[model_artifact_path, model_output_path])
+model_holder.start()
+
+# predictions of recently requested rows, emptied when the model version changes
+prediction_cache = PredictionCache(int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+                                   float(os.environ.get('PREDICTION_CACHE_TTL', 300)))
+
+def cache_key(store_id, day_of_week, date, open_store, promo, state_holiday, school_holiday):
+    # the same request spelled differently (1 or "1", dates with a time) shares one entry
+    return (int(store_id), int(day_of_week), pd.Timestamp(date).strftime('%Y-%m-%d'),
+            int(open_store), int(promo), str(state_holiday), int(school_holiday))
+
+# optional: predict the rows of concurrent /predict requests together, waiting at most
+# MICRO_BATCH_WAIT_MS for other requests to join a batch
+micro_batcher = None
+if os.environ.get('MICRO_BATCH', '0') == '1':
+    micro_batcher = MicroBatcher(lambda pipeline, input_data: pipeline.predict(input_data),
+                                 int(os.environ.get('MICRO_BATCH_SIZE', 256)),
+                                 float(os.environ.get('MICRO_BATCH_WAIT_MS', 5)) / 1000)
+
+# per-stage latency histograms served on /metrics; METRICS=0 removes the instrumentation
+metrics = Metrics() if os.environ.get('METRICS', '1') == '1' else NullMetrics()
 
-# Download and load the model when the app starts
-download_model()
-pipeline = joblib.load(model_output_path)
+def predict_in_stages(pipeline, input_data, endpoint):
+    # the same as pipeline.predict, with every step timed separately
+    if not metrics.enabled or not hasattr(pipeline, 'steps'):
+        return pipeline.predict(input_data)
+    for name, step in pipeline.steps[:-1]:
+        with metrics.stage(endpoint, name):
+            input_data = step.transform(input_data)
+    name, model = pipeline.steps[-1]
+    with metrics.stage(endpoint, name):
+        return model.predict(input_data)
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/ready')
+def ready():
+    if not model_holder.ready:
+        return jsonify({'ready': False, 'error': model_holder.error}), 503
+    return jsonify({'ready': True, 'model_version': model_holder.version, 'error': model_holder.error})
+
 @app.route('/predict', methods=['POST'])
+@metrics.instrument('predict')
 def predict():
     try:
+        # the model and version used for the whole request, even if a new one is swapped in
+        pipeline, model_version = model_holder.get()
+
         # Retrieve data from the request
-        data = request.json
-        store_id = data['store_id']
-        day_of_week = data['day_of_week']
-        date = data['date']
-        open_store = data['open_store']
-        promo = data['promo']
-        state_holiday = data['state_holiday']
-        school_holiday = data['school_holiday']
+        with metrics.stage('predict', 'parse'):
+            data = request.json
+            store_id = data['store_id']
+            day_of_week = data['day_of_week']
+            date = data['date']
+            open_store = data['open_store']
+            promo = data['promo']
+            state_holiday = data['state_holiday']
+            school_holiday = data['school_holiday']
+
+        with metrics.stage('predict', 'cache'):
+            key = cache_key(store_id, day_of_week, date, open_store, promo, state_holiday, school_holiday)
+            cached = prediction_cache.get(key, model_version)
+        if cached is not None:
+            with metrics.stage('predict', 'serialize'):
+                return jsonify({'store_id': store_id, 'predicted_sales': cached})
+
+        if micro_batcher is not None:
+            row = dict(zip(['Store', 'DayOfWeek', 'Date', 'Open', 'Promo', 'StateHoliday', 'SchoolHoliday'], key))
+            row['Date'] = pd.Timestamp(row['Date'])
+            with metrics.stage('predict', 'micro_batch'):
+                # predicted by this request's model, so it is cached under the right version
+                prediction = micro_batcher.predict(row, pipeline)
+            prediction_cache.put(key, prediction, model_version)
+            with metrics.stage('predict', 'serialize'):
+                return jsonify({'store_id': store_id, 'predicted_sales': prediction})
 
         # Create a DataFrame for the input data
-        input_data = pd.DataFrame({
-            'Store': [store_id],
-            'DayOfWeek': [day_of_week],
-            'Date': [date],  # Ensure the model can handle this format
-            'Open': [open_store],
-            'Promo': [promo],
-            'StateHoliday': [state_holiday],
-            'SchoolHoliday': [school_holiday]
-        })
-
-        # Apply any necessary preprocessing on the 'Date' field (if your model needs this)
-        input_data['Date'] = pd.to_datetime(input_data['Date'])
+        with metrics.stage('predict', 'frame'):
+            input_data = pd.DataFrame({
+                'Store': [store_id],
+                'DayOfWeek': [day_of_week],
+                'Date': [date],  # Ensure the model can handle this format
+                'Open': [open_store],
+                'Promo': [promo],
+                'StateHoliday': [state_holiday],
+                'SchoolHoliday': [school_holiday]
+            })
+
+            # Apply any necessary preprocessing on the 'Date' field (if your model needs this)
+            input_data['Date'] = pd.to_datetime(input_data['Date'])
 
         # Make prediction
-        predicted_sales = pipeline.predict(input_data)
+        predicted_sales = predict_in_stages(pipeline, input_data, 'predict')
+        prediction_cache.put(key, float(predicted_sales[0]), model_version)
 
         # Return prediction result
-        return jsonify({'store_id': store_id, 'predicted_sales': predicted_sales[0]})
+        with metrics.stage('predict', 'serialize'):
+            return jsonify({'store_id': store_id, 'predicted_sales': predicted_sales[0]})
 
+    except ModelNotReady as e:
+        # still loading, like /ready
+        return jsonify({'error': str(e), 'ready': False}), 503
     except Exception as e:
         # Handle errors and log them
         return jsonify({'error': str(e)}), 500
 
+class BatchError(ValueError):
+    def __init__(self, message, rows=None, status=400):
+        super().__init__(message)
+        self.rows = rows or []
+        self.status = status
+
+def read_batch():
+    """Request fields as columns: a JSON object of arrays, or NDJSON with one row object per line."""
+    if request.mimetype == 'application/x-ndjson':
+        rows = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise BatchError(f"Line {number} is not valid JSON: {e}", rows=[len(rows)])
+            if not isinstance(row, dict):
+                raise BatchError(f"Line {number} is not a JSON object", rows=[len(rows)])
+            rows.append(row)
+        return {field: [row.get(field) for row in rows] for field in input_columns}
+    columns = request.get_json(silent=True)
+    if not isinstance(columns, dict):
+        raise BatchError("Expected a JSON object of arrays or NDJSON rows")
+    return columns
+
+def batch_frame(columns):
+    """Validate the batch column by column and build the pipeline input in one go."""
+    missing = [field for field in input_columns if not isinstance(columns.get(field), list)]
+    if missing:
+        raise BatchError(f"Missing or non-array fields: {missing}")
+    lengths = {len(columns[field]) for field in input_columns}
+    if len(lengths) > 1:
+        raise BatchError(f"All fields must have the same length, got {sorted(lengths)}")
+    size = lengths.pop()
+    if size > app.config['MAX_BATCH_SIZE']:
+        raise BatchError(f"Batch of {size} rows exceeds the limit of {app.config['MAX_BATCH_SIZE']}", status=413)
+
+    input_data = pd.DataFrame({column: columns[field] for field, column in input_columns.items()})
+    invalid = np.zeros(size, dtype=bool)
+    for column in numeric_columns:
+        input_data[column] = pd.to_numeric(input_data[column], errors='coerce')
+        invalid |= input_data[column].isna().to_numpy()
+    invalid |= ~input_data['DayOfWeek'].between(1, 7).to_numpy()
+    input_data['Date'] = pd.to_datetime(input_data['Date'], errors='coerce', format='ISO8601')
+    invalid |= input_data['Date'].isna().to_numpy()
+    input_data['StateHoliday'] = input_data['StateHoliday'].astype(str)
+    invalid |= ~input_data['StateHoliday'].isin(state_holidays).to_numpy()
+    if invalid.any():
+        raise BatchError("Invalid values in some rows", rows=np.flatnonzero(invalid).tolist())
+    return input_data
+
+@app.route('/predict/batch', methods=['POST'])
+@metrics.instrument('predict_batch')
+def predict_batch():
+    try:
+        pipeline, model_version = model_holder.get()
+        with metrics.stage('predict_batch', 'parse'):
+            columns = read_batch()
+        with metrics.stage('predict_batch', 'frame'):
+            input_data = batch_frame(columns)
+        keys = list(zip(*(input_data[column].astype(int).tolist() for column in ['Store', 'DayOfWeek']),
+                        input_data['Date'].dt.strftime('%Y-%m-%d').tolist(),
+                        *(input_data[column].astype(int).tolist() for column in ['Open', 'Promo']),
+                        input_data['StateHoliday'].tolist(),
+                        input_data['SchoolHoliday'].astype(int).tolist()))
+        predicted_sales = np.array(prediction_cache.get_many(keys, model_version), dtype=float)
+
+        # one predict call for all the rows that were not cached
+        missing = np.flatnonzero(np.isnan(predicted_sales))
+        if len(missing):
+            rows = input_data if len(missing) == len(input_data) else input_data.iloc[missing].copy()
+            predicted_sales[missing] = predict_in_stages(pipeline, rows, 'predict_batch')
+            prediction_cache.put_many([keys[i] for i in missing], predicted_sales[missing].tolist(), model_version)
+        with metrics.stage('predict_batch', 'serialize'):
+            return jsonify({'store_id': input_data['Store'].tolist(), 'predicted_sales': predicted_sales.tolist()})
+
+    except BatchError as e:
+        return jsonify({'error': str(e), 'rows': e.rows}), e.status
+    except ModelNotReady as e:
+        return jsonify({'error': str(e), 'ready': False}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/batching/stats')
+def batching_stats():
+    return jsonify(micro_batcher.stats() if micro_batcher is not None else {'enabled': False})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if not metrics.enabled:
+        return 'metrics are disabled\n', 404, {'Content-Type': 'text/plain'}
+    cache = prediction_cache.stats()
+    counters = {
+        'prediction_cache_hits': ("Prediction cache hits", cache['hits']),
+        'prediction_cache_misses': ("Prediction cache misses", cache['misses']),
+        'prediction_cache_evictions': ("Predictions evicted from the full cache", cache['evictions']),
+    }
+    gauges = {
+        'prediction_cache_size': ("Predictions in the cache", cache['size']),
+        'model_ready': ("1 once a model is loaded", int(model_holder.ready)),
+    }
+    if micro_batcher is not None:
+        batching = micro_batcher.stats()
+        counters['micro_batches'] = ("Micro-batches predicted", batching['batches'])
+        gauges['micro_batch_mean_size'] = ("Mean rows per micro-batch", batching['mean_batch_size'])
+    return metrics.render(gauges, counters), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
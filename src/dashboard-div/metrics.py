@@ -0,0 +1,114 @@
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+
+class _Stage:
+    def __init__(self, metrics, endpoint, stage):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.endpoint, self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Per-stage latency histograms and request counters in the Prometheus text format."""
+    enabled = True
+
+    def __init__(self, buckets=None, prefix='sales'):
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.prefix = prefix
+        # (endpoint, stage) -> [bucket counts..., sum, count]
+        self._latencies = defaultdict(lambda: [0] * len(self.buckets) + [0.0, 0])
+        # (endpoint, status) -> count
+        self._requests = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, stage, seconds):
+        with self._lock:
+            histogram = self._latencies[(endpoint, stage)]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def stage(self, endpoint, stage):
+        """Context manager recording the time spent in its block."""
+        return _Stage(self, endpoint, stage)
+
+    def instrument(self, endpoint):
+        """Decorator for a view: total latency and request count by status code."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                response = view(*args, **kwargs)
+                self.observe(endpoint, 'total', time.perf_counter() - start)
+                status = response[1] if isinstance(response, tuple) else 200
+                with self._lock:
+                    self._requests[(endpoint, status)] += 1
+                return response
+            return wrapper
+        return decorator
+
+    def render(self, gauges=None, counters=None):
+        """Metrics in the Prometheus text exposition format, plus `gauges` and `counters` ({name: (help, value)}).
+
+        Counters only ever grow; they are exported with the `_total` suffix.
+        """
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Latency of each stage of a request", f"# TYPE {name} histogram"]
+        with self._lock:
+            latencies = {key: list(values) for key, values in self._latencies.items()}
+            requests = dict(self._requests)
+        for (endpoint, stage), histogram in sorted(latencies.items()):
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram[-2]}")
+            lines.append(f"{name}_count{{{labels}}} {histogram[-1]}")
+
+        name = f"{self.prefix}_requests_total"
+        lines += [f"# HELP {name} Requests by endpoint and status code", f"# TYPE {name} counter"]
+        for (endpoint, status), count in sorted(requests.items()):
+            lines.append(f'{name}{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        for counter, (description, value) in (counters or {}).items():
+            counter = f"{self.prefix}_{counter}_total"
+            lines += [f"# HELP {counter} {description}", f"# TYPE {counter} counter", f"{counter} {value}"]
+        for gauge, (description, value) in (gauges or {}).items():
+            gauge = f"{self.prefix}_{gauge}"
+            lines += [f"# HELP {gauge} {description}", f"# TYPE {gauge} gauge", f"{gauge} {value}"]
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics:
+    """Stand-in when metrics are disabled: views are left undecorated and stages cost nothing."""
+    enabled = False
+    _stage = nullcontext()
+
+    def observe(self, endpoint, stage, seconds):
+        pass
+
+    def stage(self, endpoint, stage):
+        return self._stage
+
+    def instrument(self, endpoint):
+        return lambda view: view
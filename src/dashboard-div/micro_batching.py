@@ -0,0 +1,97 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Groups rows submitted by concurrent requests into one predict call.
+
+    A background thread takes the first waiting row, then gathers the rows that arrive
+    within `max_wait` seconds (up to `max_batch_size`) and predicts them together with
+    `predict_fn(model, DataFrame) -> array`. Every row is predicted by the model its request
+    submitted it with, so a batch that spans a model swap makes one call per model.
+    The window is only used when requests have recently been arriving concurrently;
+    sequential traffic is predicted right away.
+    """
+    def __init__(self, predict_fn, max_batch_size=256, max_wait=0.005):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        # moving average of the batch sizes, tells whether requests overlap
+        self.average_batch_size = 1.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, row, model):
+        """Queue one row (a dict of input columns) for `model`; the future resolves to its prediction."""
+        future = Future()
+        self._queue.put((row, future, model))
+        return future
+
+    def predict(self, row, model, timeout=None):
+        return self.submit(row, model).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        wait = self.max_wait if self.average_batch_size > 1.5 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _predict_rows(self, batch):
+        predictions = self.predict_fn(batch[0][2], pd.DataFrame([row for row, _, _ in batch]))
+        if len(predictions) != len(batch):
+            raise ValueError(f"{len(predictions)} predictions for {len(batch)} rows")
+        for (_, future, _), prediction in zip(batch, predictions):
+            future.set_result(float(prediction))
+
+    def _predict_group(self, batch):
+        try:
+            self._predict_rows(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # a bad row must not fail the requests batched with it
+            logger.warning(f"Batch of {len(batch)} rows failed ({e}), predicting the rows one by one")
+            for item in batch:
+                try:
+                    self._predict_rows([item])
+                except Exception as row_error:
+                    item[1].set_exception(row_error)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.rows += len(batch)
+            self.average_batch_size = 0.8 * self.average_batch_size + 0.2 * len(batch)
+            # the rows of requests that started before and after a model swap are not mixed
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[2]), []).append(item)
+            for group in groups.values():
+                self._predict_group(group)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'recent_batch_size': self.average_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Bounded LRU cache of predictions whose entries expire after `ttl` seconds.
+
+    Every lookup passes the version of the model in use; when it differs from the version
+    the entries were computed with, the cache is emptied. Values stored for any other
+    version than the last looked up one are dropped. `max_size=0` disables caching.
+    Safe to share between the threads of the server.
+    """
+    def __init__(self, max_size=10000, ttl=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get_many(self, keys, version):
+        """Cached value of every key, None for the misses."""
+        values = []
+        with self._lock:
+            self._check_version(version)
+            now = self.clock()
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values.append(entry[0])
+        return values
+
+    def put_many(self, keys, values, version):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            # computed by a model that has been swapped out since the lookup
+            if version != self.version:
+                return
+            expires = self.clock() + self.ttl
+            for key, value in zip(keys, values):
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key, version):
+        return self.get_many([key], version)[0]
+
+    def put(self, key, value, version):
+        self.put_many([key], [value], version)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'model_version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
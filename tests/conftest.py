@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts import their siblings at the top level, like when they are run from their folder
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ['scripts', os.path.join('scripts', 'model_training'), os.path.join('src', 'dashboard-div')]:
+    sys.path.insert(0, os.path.join(ROOT, folder))
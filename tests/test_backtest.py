@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import backtest, expanding_window_folds
+from synthetic_data import SyntheticRossmann
+
+
+def panel_ordinals(n_days=100, n_stores=3):
+    # one row per store and day, sorted by date like the backtest panel
+    return np.repeat(np.arange(n_days), n_stores)
+
+
+def test_expanding_window_folds_test_the_days_after_their_training_window():
+    ordinals = panel_ordinals()
+    folds = expanding_window_folds(ordinals, n_folds=3, horizon_days=10)
+    assert len(folds) == 3
+    for train_end, test_end in folds:
+        # training rows are all dated before the test window, which is horizon_days long
+        assert ordinals[train_end - 1] < ordinals[train_end]
+        assert len(np.unique(ordinals[train_end:test_end])) == 10
+    # the windows expand, follow each other and the last one ends on the last date
+    assert [train_end for train_end, _ in folds[1:]] == [test_end for _, test_end in folds[:-1]]
+    assert folds[-1][1] == len(ordinals)
+
+
+def test_expanding_window_folds_need_some_history():
+    with pytest.raises(ValueError):
+        expanding_window_folds(panel_ordinals(n_days=30), n_folds=3, horizon_days=10)
+
+
+def test_backtest_reports_one_row_per_fold(tmp_path):
+    data = SyntheticRossmann(n_stores=4, start='2015-01-01', end='2015-04-30', test_days=0, seed=3)
+    path = data.write(str(tmp_path))['train']
+    report = backtest(path, n_folds=3, horizon_days=14, n_jobs=1, backend='linear')
+
+    assert list(report['fold']) == [0, 1, 2]
+    assert (report['train_end'] < report['test_start']).all()
+    assert ((report['test_end'] - report['test_start']) == pd.Timedelta(days=13)).all()
+    assert report['test_end'].iloc[-1] == pd.Timestamp('2015-04-30')
+    assert report['n_train'].is_monotonic_increasing
+    assert (report[['rmse', 'rmspe']] > 0).all().all()
@@ -0,0 +1,55 @@
+import os
+import pandas as pd
+import pytest
+import data_loader
+from data_loader import CACHE_DIR_NAME, cache_path, load_cached
+
+CSV = "Store,DayOfWeek,Date,Sales,Customers,Open,Promo,StateHoliday,SchoolHoliday\n" \
+      "1,5,2015-07-31,5263,555,1,1,0,1\n" \
+      "2,5,2015-07-31,6064,625,1,1,a,1\n"
+
+
+@pytest.fixture
+def train_csv(tmp_path):
+    path = tmp_path / 'train.csv'
+    path.write_text(CSV)
+    return str(path)
+
+
+def caches(path):
+    return sorted(os.listdir(os.path.join(os.path.dirname(path), CACHE_DIR_NAME)))
+
+
+def test_cache_is_reused_until_the_file_changes(train_csv):
+    first = load_cached(train_csv)
+    assert caches(train_csv) == [os.path.basename(cache_path(train_csv))]
+    pd.testing.assert_frame_equal(load_cached(train_csv), first)
+    assert len(caches(train_csv)) == 1
+
+    with open(train_csv, 'a') as f:
+        f.write("3,5,2015-07-31,8314,821,1,1,0,1\n")
+    os.utime(train_csv, ns=(os.stat(train_csv).st_atime_ns, os.stat(train_csv).st_mtime_ns + 10**9))
+    assert len(load_cached(train_csv)) == 3
+    # the cache of the old version is dropped
+    assert caches(train_csv) == [os.path.basename(cache_path(train_csv))]
+
+
+def test_dvc_md5_keys_the_cache(train_csv):
+    with open(f"{train_csv}.dvc", 'w') as f:
+        f.write("outs:\n- md5: 0123abcd\n  path: train.csv\n")
+    assert '0123abcd' in cache_path(train_csv)
+
+
+def test_schema_change_rebuilds_the_cache(train_csv, monkeypatch):
+    old = cache_path(train_csv)
+    assert load_cached(train_csv)['Sales'].dtype == 'int32'
+
+    monkeypatch.setitem(data_loader.SCHEMAS, 'train', {**data_loader.SCHEMAS['train'], 'Sales': 'float64'})
+    assert cache_path(train_csv) != old
+    assert load_cached(train_csv)['Sales'].dtype == 'float64'
+
+
+def test_format_version_is_part_of_the_key(train_csv, monkeypatch):
+    old = cache_path(train_csv)
+    monkeypatch.setattr(data_loader, 'CACHE_FORMAT_VERSION', data_loader.CACHE_FORMAT_VERSION + 1)
+    assert cache_path(train_csv) != old
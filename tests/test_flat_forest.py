@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from flat_forest import PREDICT_CHUNK_ROWS, FlatForestRegressor
+from model_artifact import load_artifact, save_artifact
+
+
+@pytest.fixture(scope='module')
+def forest_and_rows():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(PREDICT_CHUNK_ROWS + 500, 6))
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=len(X))
+    # missing values follow the side learned for them
+    X[rng.random(X.shape) < 0.05] = np.nan
+    forest = RandomForestRegressor(n_estimators=15, min_samples_leaf=2, random_state=0).fit(X, y)
+    return forest, X
+
+
+# single rows, small batches and both sides of the chunk size
+SIZES = [1, 8, 9, 100, PREDICT_CHUNK_ROWS, PREDICT_CHUNK_ROWS + 1]
+
+
+@pytest.mark.parametrize('n_rows', SIZES)
+def test_flat_forest_predicts_like_the_forest(forest_and_rows, n_rows):
+    forest, X = forest_and_rows
+    flat = FlatForestRegressor.from_forest(forest)
+    np.testing.assert_array_equal(flat.predict(X[:n_rows]), forest.predict(X[:n_rows]))
+
+
+def test_loaded_artifact_predicts_like_the_forest(forest_and_rows, tmp_path):
+    forest, X = forest_and_rows
+    path = str(tmp_path / 'model.artifact')
+    save_artifact(Pipeline([('model', forest)]), path)
+    loaded = load_artifact(path)
+    model = loaded.named_steps['model']
+    assert isinstance(model, FlatForestRegressor)
+    # served from the memory-mapped file, not from a private copy
+    assert isinstance(model.children_, np.memmap) or isinstance(model.children_.base, np.memmap)
+    for n_rows in SIZES:
+        np.testing.assert_array_equal(loaded.predict(X[:n_rows]), forest.predict(X[:n_rows]))
+
+
+def test_flat_forest_is_only_built_from_a_forest(forest_and_rows):
+    forest, X = forest_and_rows
+    with pytest.raises(TypeError, match='from_forest'):
+        FlatForestRegressor().fit(X, forest.predict(X))
+
+
+def test_flat_forest_saved_with_left_and_right_children_still_predicts(forest_and_rows):
+    forest, X = forest_and_rows
+    state = FlatForestRegressor.from_forest(forest).__getstate__()
+    # the layout before the children were interleaved
+    children = state.pop('children_').reshape(-1, 2)
+    leaf = state['feature_'] < 0
+    state['left_'] = np.where(leaf, -1, children[:, 0])
+    state['right_'] = np.where(leaf, -1, children[:, 1])
+    legacy = FlatForestRegressor.__new__(FlatForestRegressor)
+    legacy.__setstate__(state)
+    np.testing.assert_array_equal(legacy.predict(X[:100]), forest.predict(X[:100]))
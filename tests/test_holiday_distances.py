@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+from pipeline_steps import CategoricalToNumerical, FeatureExtractor
+from synthetic_data import SyntheticRossmann
+
+COLUMNS = ['Weekend', 'MonthPosition', 'DaysSinceStartOfYear', 'DaysToNextHoliday', 'DaysAfterHoliday']
+
+
+def row_by_row_features(X):
+    """The date features one row at a time, the way FeatureExtractor computed them before the calendar."""
+    X = X.copy()
+    X['Date'] = pd.to_datetime(X['Date'], errors='coerce')
+    X['Weekend'] = X['DayOfWeek'].apply(lambda x: 1 if x >= 6 else 0)
+    X['MonthPosition'] = LabelEncoder().fit_transform(
+        X['Date'].dt.day.apply(lambda x: 'Start' if x <= 10 else ('Mid' if x <= 20 else 'End')))
+    X['DaysSinceStartOfYear'] = X['Date'].apply(
+        lambda x: (x - pd.Timestamp(f'{x.year}-01-01')).days if pd.notnull(x) else np.nan)
+    holidays = pd.to_datetime(X[(X['StateHoliday'] != '0') & (X['StateHoliday'].notnull())]['Date'].unique())
+
+    def days_to_next_holiday(date):
+        future_holidays = holidays[holidays >= date]
+        return (future_holidays.min() - date).days if len(future_holidays) > 0 else -1
+
+    X['DaysToNextHoliday'] = X['Date'].apply(days_to_next_holiday)
+    X['DaysAfterHoliday'] = X['Date'].apply(
+        lambda x: (x - holidays[holidays <= x].max()).days if len(holidays[holidays <= x]) > 0 else np.nan)
+    return X[COLUMNS]
+
+
+@pytest.fixture
+def frame():
+    # a few months around new year with public holidays, rows shuffled
+    train = SyntheticRossmann(n_stores=6, start='2014-10-01', end='2015-05-31', test_days=0, seed=3).train_frame()
+    X = train.drop(columns=['Sales', 'Customers']).sample(frac=1, random_state=0).reset_index(drop=True)
+    X['StateHoliday'] = X['StateHoliday'].astype(object)
+    return X
+
+
+def assert_same_features(expected, features):
+    for column in COLUMNS:
+        np.testing.assert_array_equal(features[column].to_numpy(dtype=np.float64),
+                                      expected[column].to_numpy(dtype=np.float64), err_msg=column)
+
+
+def test_holiday_distances_match_the_row_by_row_loop(frame):
+    assert (frame['StateHoliday'] != '0').any()
+    X = CategoricalToNumerical().fit_transform(frame.copy())
+    assert_same_features(row_by_row_features(frame), FeatureExtractor().fit_transform(X.copy()))
+
+
+def test_unfitted_extractor_matches_the_row_by_row_loop(frame):
+    X = CategoricalToNumerical().fit_transform(frame.copy())
+    assert_same_features(row_by_row_features(frame), FeatureExtractor().transform(X.copy()))
+
+
+def test_chunked_fit_matches_fit(frame):
+    X = CategoricalToNumerical().fit_transform(frame.copy())
+    extractor = FeatureExtractor()
+    ordered = X.sort_values('Date')
+    for start in range(0, len(ordered), len(ordered) // 4):
+        extractor.partial_fit(ordered.iloc[start:start + len(ordered) // 4])
+    pd.testing.assert_frame_equal(extractor.transform(X.copy()), FeatureExtractor().fit(X).transform(X.copy()))
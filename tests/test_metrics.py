@@ -0,0 +1,71 @@
+import sys
+import pytest
+from metrics import Metrics, NullMetrics
+
+
+def samples(text):
+    """{sample name with labels: value} of a Prometheus text exposition."""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def types(text):
+    return {line.split()[2]: line.split()[3] for line in text.splitlines() if line.startswith('# TYPE')}
+
+
+def test_stage_latencies_are_cumulative_histograms():
+    metrics = Metrics(buckets=[0.1, 1.0])
+    for seconds in [0.05, 0.5, 0.5, 5.0]:
+        metrics.observe('predict', 'model', seconds)
+    values = samples(metrics.render())
+    labels = 'endpoint="predict",stage="model"'
+    assert values[f'sales_stage_seconds_bucket{{{labels},le="0.1"}}'] == 1
+    assert values[f'sales_stage_seconds_bucket{{{labels},le="1.0"}}'] == 3
+    assert values[f'sales_stage_seconds_bucket{{{labels},le="+Inf"}}'] == 4
+    assert values[f'sales_stage_seconds_count{{{labels}}}'] == 4
+    assert values[f'sales_stage_seconds_sum{{{labels}}}'] == pytest.approx(6.05)
+
+
+def test_requests_are_counted_by_status():
+    metrics = Metrics()
+    ok = metrics.instrument('predict')(lambda: 'ok')
+    failing = metrics.instrument('predict')(lambda: ('error', 500))
+    ok(), ok(), failing()
+    text = metrics.render()
+    values = samples(text)
+    assert values['sales_requests_total{endpoint="predict",status="200"}'] == 2
+    assert values['sales_requests_total{endpoint="predict",status="500"}'] == 1
+    assert values['sales_stage_seconds_count{endpoint="predict",stage="total"}'] == 3
+    assert types(text)['sales_requests_total'] == 'counter'
+
+
+def test_counters_get_the_total_suffix():
+    text = Metrics().render(gauges={'prediction_cache_size': ("Predictions in the cache", 3)},
+                            counters={'prediction_cache_hits': ("Prediction cache hits", 7)})
+    assert samples(text)['sales_prediction_cache_hits_total'] == 7
+    assert samples(text)['sales_prediction_cache_size'] == 3
+    assert types(text)['sales_prediction_cache_hits_total'] == 'counter'
+    assert types(text)['sales_prediction_cache_size'] == 'gauge'
+
+
+def test_null_metrics_leave_the_views_alone():
+    metrics = NullMetrics()
+    view = lambda: 'ok'
+    assert metrics.instrument('predict')(view) is view
+    with metrics.stage('predict', 'model'):
+        pass
+
+
+def test_the_app_exports_the_cache_lookups_as_counters(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MODEL_REGISTRY_DIR', str(tmp_path / 'models'))
+    monkeypatch.setenv('MODEL_POLL_SECONDS', '3600')
+    sys.modules.pop('app', None)
+    import app
+    try:
+        text = app.app.test_client().get('/metrics').get_data(as_text=True)
+    finally:
+        sys.modules.pop('app', None)
+    assert types(text)['sales_prediction_cache_hits_total'] == 'counter'
+    assert types(text)['sales_prediction_cache_misses_total'] == 'counter'
+    assert types(text)['sales_prediction_cache_size'] == 'gauge'
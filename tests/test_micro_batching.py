@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+import pytest
+from micro_batching import MicroBatcher
+
+
+class Model:
+    """Predicts `offset + x` and records the size of every predict call."""
+    def __init__(self, offset=0.0, fail_on=None):
+        self.offset = offset
+        self.fail_on = fail_on
+        self.calls = []
+
+    def predict(self, frame):
+        self.calls.append(len(frame))
+        if self.fail_on is not None and (frame['x'] == self.fail_on).any():
+            raise ValueError('bad row')
+        return self.offset + frame['x'].to_numpy(dtype=float)
+
+
+def predict(model, frame):
+    return model.predict(frame)
+
+
+class Blocker:
+    """Holds the batcher's worker in a predict call until released, so rows queue up."""
+    def __init__(self, batcher):
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.future = batcher.submit({'x': 0}, self)
+        assert self.started.wait(5)
+
+    def predict(self, frame):
+        self.started.set()
+        self.released.wait(5)
+        return np.zeros(len(frame))
+
+    def release(self):
+        self.released.set()
+        self.future.result(5)
+
+
+def test_rows_get_their_own_prediction():
+    batcher = MicroBatcher(predict, max_wait=0.05)
+    model = Model(offset=100)
+    assert batcher.predict({'x': 1}, model, timeout=5) == 101
+    futures = [batcher.submit({'x': x}, model) for x in range(20)]
+    assert [future.result(5) for future in futures] == [100 + x for x in range(20)]
+    assert batcher.stats()['rows'] == 21
+
+
+def test_concurrent_rows_are_predicted_together():
+    model = Model()
+    batcher = MicroBatcher(predict, max_batch_size=8)
+    blocker = Blocker(batcher)
+    futures = [batcher.submit({'x': x}, model) for x in range(20)]
+    blocker.release()
+    assert [future.result(5) for future in futures] == list(range(20))
+    assert model.calls == [8, 8, 4]
+
+
+def test_rows_are_predicted_by_the_model_they_were_submitted_with():
+    old, new = Model(offset=0), Model(offset=1000)
+    batcher = MicroBatcher(predict)
+    blocker = Blocker(batcher)
+    # a model swap between requests that end up in the same batch
+    futures = [batcher.submit({'x': x}, old if x % 2 else new) for x in range(10)]
+    blocker.release()
+    assert [future.result(5) for future in futures] == [x if x % 2 else 1000 + x for x in range(10)]
+    assert old.calls == [5] and new.calls == [5]
+
+
+def test_a_bad_row_only_fails_its_own_request():
+    model = Model(fail_on=3)
+    batcher = MicroBatcher(predict)
+    blocker = Blocker(batcher)
+    futures = [batcher.submit({'x': x}, model) for x in range(5)]
+    blocker.release()
+    with pytest.raises(ValueError):
+        futures[3].result(5)
+    assert [futures[x].result(5) for x in [0, 1, 2, 4]] == [0, 1, 2, 4]
@@ -0,0 +1,138 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import joblib
+import pytest
+from sklearn.dummy import DummyRegressor
+from model_registry import (SEED_LOCK_FILE, ModelHolder, ModelNotReady, activate_version, current_version,
+                            list_versions, lock_is_stale, publish_model)
+
+
+def constant_model(value):
+    return DummyRegressor(strategy='constant', constant=value).fit([[0]], [value])
+
+
+def served_value(holder):
+    model, _ = holder.get()
+    return model.predict([[0]])[0]
+
+
+def write_lock(registry_dir, pid, host, created):
+    os.makedirs(registry_dir, exist_ok=True)
+    with open(os.path.join(registry_dir, SEED_LOCK_FILE), 'w') as f:
+        f.write(f"{pid} {host} {created}")
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def seed_file(tmp_path):
+    seed = str(tmp_path / 'final_model.pkl')
+    joblib.dump(constant_model(3.0), seed)
+    return seed
+
+
+def test_activated_versions_are_swapped_in(tmp_path):
+    registry = str(tmp_path)
+    first = publish_model(constant_model(1.0), registry)
+    holder = ModelHolder(registry)
+    assert served_value(holder) == 1.0
+    in_flight = holder.get()
+
+    second = publish_model(constant_model(2.0), registry)
+    assert list_versions(registry) == [first, second]
+    assert holder.refresh()
+    assert (served_value(holder), holder.version) == (2.0, second)
+    # a request keeps the model it started with
+    assert in_flight[1] == first and in_flight[0].predict([[0]])[0] == 1.0
+
+    # rolling back is activating the previous version
+    activate_version(registry, first)
+    assert holder.refresh()
+    assert (served_value(holder), holder.version) == (1.0, first)
+    assert not holder.refresh()
+
+
+def test_a_version_failing_its_warmup_is_not_served(tmp_path):
+    registry = str(tmp_path)
+    publish_model(constant_model(1.0), registry)
+
+    def warmup(model):
+        if model.predict([[0]])[0] < 0:
+            raise ValueError('broken model')
+
+    holder = ModelHolder(registry, warmup)
+    assert served_value(holder) == 1.0
+    broken = publish_model(constant_model(-1.0), registry)
+    assert not holder.refresh()
+    assert served_value(holder) == 1.0
+    assert broken in holder.error
+
+
+def test_an_empty_registry_is_not_ready(tmp_path):
+    holder = ModelHolder(str(tmp_path))
+    assert not holder.ready
+    with pytest.raises(ModelNotReady):
+        holder.get()
+
+
+def test_an_empty_registry_is_seeded_from_the_first_existing_file(tmp_path, seed_file):
+    registry = str(tmp_path / 'models')
+    holder = ModelHolder(registry, seed_paths=[str(tmp_path / 'missing.artifact'), seed_file])
+    version = holder.seed()
+    assert current_version(registry) == version
+    assert served_value(holder) == 3.0
+    assert not os.path.exists(os.path.join(registry, SEED_LOCK_FILE))
+    # a registry with a version is never seeded again
+    assert holder.seed() is None
+
+
+def test_a_live_seeding_lock_is_respected(tmp_path, seed_file):
+    registry = str(tmp_path / 'models')
+    write_lock(registry, os.getpid(), socket.gethostname(), time.time())
+    assert ModelHolder(registry, seed_paths=[seed_file]).seed() is None
+    assert list_versions(registry) == []
+
+
+@pytest.mark.parametrize('owner', ['dead_process', 'timed_out'])
+def test_a_stale_seeding_lock_is_taken_over(tmp_path, seed_file, owner):
+    registry = str(tmp_path / 'models')
+    if owner == 'dead_process':
+        write_lock(registry, dead_pid(), socket.gethostname(), time.time())
+    else:
+        # a live process, on another host, that started seeding too long ago
+        write_lock(registry, os.getpid(), 'another-host', time.time() - 120)
+    lock = os.path.join(registry, SEED_LOCK_FILE)
+    assert lock_is_stale(lock, timeout=60)
+
+    version = ModelHolder(registry, seed_paths=[seed_file], seed_lock_timeout=60).seed()
+    assert version is not None and list_versions(registry) == [version]
+    assert not os.path.exists(lock)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # an app started on an empty registry with no model files to seed it from
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MODEL_REGISTRY_DIR', str(tmp_path / 'models'))
+    monkeypatch.setenv('MODEL_POLL_SECONDS', '3600')
+    sys.modules.pop('app', None)
+    import app
+    yield app.app.test_client()
+    sys.modules.pop('app', None)
+
+
+def test_predictions_are_unavailable_until_a_model_is_ready(client):
+    assert client.get('/ready').status_code == 503
+    row = {'store_id': 1, 'day_of_week': 3, 'date': '2015-03-04', 'open_store': 1, 'promo': 1,
+           'state_holiday': '0', 'school_holiday': 0}
+    response = client.post('/predict', json=row)
+    assert response.status_code == 503 and response.json['ready'] is False
+    response = client.post('/predict/batch', json={name: [value] for name, value in row.items()})
+    assert response.status_code == 503
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+import parallel_features
+from parallel_features import fork_available, store_partitions
+from pipeline_steps import CategoricalToNumerical, FeatureExtractor
+from synthetic_data import SyntheticRossmann
+
+pytestmark = pytest.mark.skipif(not fork_available(), reason="the partitioned transform needs fork")
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    # small enough for a test, but still split over the pool
+    monkeypatch.setattr(parallel_features, 'PARALLEL_MIN_ROWS', 0)
+    train = SyntheticRossmann(n_stores=40, start='2014-11-01', end='2015-02-28', test_days=0, seed=5).train_frame()
+    X = train.drop(columns=['Sales', 'Customers']).sample(frac=1, random_state=1).reset_index(drop=True)
+    return CategoricalToNumerical().fit_transform(X)
+
+
+def test_store_partitions_cover_every_row_once():
+    stores = np.random.default_rng(0).integers(1, 50, size=1000)
+    partitions = store_partitions(stores, 3)
+    rows = np.concatenate(partitions)
+    assert np.array_equal(np.sort(rows), np.arange(len(stores)))
+    # a store is never split between partitions
+    assert sum(len(np.unique(stores[part])) for part in partitions) == len(np.unique(stores))
+
+
+@pytest.mark.parametrize('holiday_group', [None, 'Store'])
+def test_parallel_transform_matches_serial(encoded, holiday_group):
+    serial = FeatureExtractor(holiday_group=holiday_group).fit(encoded)
+    parallel = FeatureExtractor(holiday_group=holiday_group, n_jobs=2).fit(encoded)
+    pd.testing.assert_frame_equal(parallel.transform(encoded.copy()), serial.transform(encoded.copy()))
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import pytest
+from synthetic_data import SyntheticRossmann
+
+ROW = {'store_id': 1, 'day_of_week': 3, 'date': '2015-03-04', 'open_store': 1, 'promo': 1,
+       'state_holiday': '0', 'school_holiday': 0}
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    import pipeline_withotgrid as p
+    from model_registry import publish_model
+
+    train = SyntheticRossmann(n_stores=5, start='2015-01-01', end='2015-03-31', test_days=0, seed=2).train_frame()
+    model = p.build_pipeline(n_estimators=5, max_depth=6, random_state=0)
+    model.fit(train.drop(columns=['Sales', 'Customers']), train['Sales'])
+    registry_dir = str(tmp_path_factory.mktemp('models'))
+    publish_model(model, registry_dir)
+
+    environment = {'MODEL_REGISTRY_DIR': registry_dir, 'MODEL_POLL_SECONDS': '3600'}
+    previous = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    sys.modules.pop('app', None)
+    import app
+    yield app.app.test_client()
+    for name, value in previous.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def ndjson(*lines):
+    return '\n'.join(lines)
+
+
+def post_ndjson(client, body):
+    return client.post('/predict/batch', data=body, content_type='application/x-ndjson')
+
+
+def test_columns_and_ndjson_give_the_single_row_prediction(client):
+    single = client.post('/predict', json=ROW).get_json()['predicted_sales']
+    columns = client.post('/predict/batch', json={field: [value] * 3 for field, value in ROW.items()})
+    assert columns.status_code == 200
+    assert columns.get_json()['predicted_sales'] == pytest.approx([single] * 3)
+    rows = post_ndjson(client, ndjson(json.dumps(ROW), '', json.dumps(ROW)))
+    assert rows.status_code == 200
+    assert rows.get_json()['predicted_sales'] == pytest.approx([single] * 2)
+
+
+def test_state_holiday_number_predicts_like_the_string(client):
+    as_string = client.post('/predict/batch', json={field: [value] for field, value in ROW.items()})
+    as_number = client.post('/predict/batch', json={**{field: [value] for field, value in ROW.items()},
+                                                    'state_holiday': [0]})
+    assert as_number.get_json()['predicted_sales'] == as_string.get_json()['predicted_sales']
+
+
+def test_malformed_ndjson_line_is_a_bad_request(client):
+    response = post_ndjson(client, ndjson(json.dumps(ROW), '', '{"store_id": 1,'))
+    assert response.status_code == 400
+    assert 'Line 3' in response.get_json()['error']
+    assert response.get_json()['rows'] == [1]
+
+
+def test_ndjson_line_that_is_not_an_object_is_a_bad_request(client):
+    response = post_ndjson(client, ndjson(json.dumps(ROW), '[1, 2]'))
+    assert response.status_code == 400
+    assert 'Line 2' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('body', [
+    [ROW],
+    {field: [value] for field, value in ROW.items() if field != 'promo'},
+    {**{field: [value] * 2 for field, value in ROW.items()}, 'promo': [1]},
+])
+def test_malformed_columns_are_a_bad_request(client, body):
+    response = client.post('/predict/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_invalid_values_report_their_rows(client):
+    body = {field: [value] * 4 for field, value in ROW.items()}
+    body['day_of_week'][1] = 9
+    body['date'][2] = 'not a date'
+    body['state_holiday'][3] = 'x'
+    response = client.post('/predict/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['rows'] == [1, 2, 3]
+
+
+def test_batch_over_the_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'MAX_BATCH_SIZE', 2)
+    response = client.post('/predict/batch', json={field: [value] * 3 for field, value in ROW.items()})
+    assert response.status_code == 413
@@ -0,0 +1,68 @@
+from prediction_cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_and_misses():
+    cache = PredictionCache(max_size=10)
+    assert cache.get('a', 'v1') is None
+    cache.put('a', 1.0, 'v1')
+    assert cache.get_many(['a', 'b'], 'v1') == [1.0, None]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 1)
+    assert stats['hit_rate'] == 1 / 3
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.get('a', 'v1')
+    cache.put_many(['a', 'b'], [1.0, 2.0], 'v1')
+    # 'a' is used again, so 'b' is the one evicted by 'c'
+    cache.get('a', 'v1')
+    cache.put('c', 3.0, 'v1')
+    assert cache.get_many(['a', 'b', 'c'], 'v1') == [1.0, None, 3.0]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = PredictionCache(ttl=10.0, clock=clock)
+    cache.get('a', 'v1')
+    cache.put('a', 1.0, 'v1')
+    clock.now = 9.9
+    assert cache.get('a', 'v1') == 1.0
+    clock.now = 10.0
+    assert cache.get('a', 'v1') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_a_new_model_version_empties_the_cache():
+    cache = PredictionCache()
+    cache.get('a', 'v1')
+    cache.put('a', 1.0, 'v1')
+    assert cache.get('a', 'v2') is None
+    stats = cache.stats()
+    assert (stats['size'], stats['invalidations'], stats['model_version']) == (0, 1, 'v2')
+
+
+def test_values_of_a_swapped_out_model_are_not_stored():
+    cache = PredictionCache()
+    cache.get('a', 'v1')
+    # the model changed between this request's lookup and its prediction
+    cache.get('b', 'v2')
+    cache.put('a', 1.0, 'v1')
+    assert cache.get('a', 'v2') is None
+
+
+def test_size_zero_disables_the_cache():
+    cache = PredictionCache(max_size=0)
+    cache.get('a', 'v1')
+    cache.put('a', 1.0, 'v1')
+    assert cache.get('a', 'v1') is None
+    assert cache.stats()['size'] == 0
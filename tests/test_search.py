@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+from profiling import profile_run
+from search import halving_search, record_search
+
+PARAM_GRID = {
+    'model__n_estimators': [5, 10, 20],
+    'model__max_depth': [2, 4, 8],
+    'model__min_samples_leaf': [1, 5],
+}
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(3000, 4)), columns=list('abcd'))
+    y = 3 * X['a'] - X['b'] ** 2 + rng.normal(scale=0.1, size=len(X))
+    return X, y
+
+
+def forest():
+    return Pipeline([('model', RandomForestRegressor(n_estimators=5, random_state=0))])
+
+
+@pytest.mark.parametrize('n_candidates', [None, 6])
+def test_halving_search_last_round_uses_all_rows(data, n_candidates):
+    X, y = data
+    search = halving_search(forest(), X, y, PARAM_GRID, n_candidates=n_candidates, cv=3, n_jobs=1)
+    # the last round is cross-validated on close to all the rows
+    assert len(X) / search.factor < search.n_resources_[-1] <= len(X)
+
+
+def test_halving_search_over_trees_refits_the_largest_forest(data):
+    X, y = data
+    search = halving_search(forest(), X, y, PARAM_GRID, resource='model__n_estimators', max_resources=27,
+                            n_candidates=6, cv=3, n_jobs=1)
+    assert search.n_resources_[-1] == 27
+    assert search.best_params_['model__n_estimators'] == 27
+    assert len(search.best_estimator_.named_steps['model'].estimators_) == 27
+
+
+def test_record_search_adds_a_span_per_candidate(data, tmp_path):
+    X, y = data
+    search = GridSearchCV(forest(), {'model__max_depth': [2, 4]}, cv=3, scoring='neg_mean_squared_error').fit(X, y)
+    with profile_run('search', str(tmp_path / 'profile.json')):
+        record_search(search)
+    candidates = json.load(open(tmp_path / 'profile.json'))['children']
+    assert [node['name'] for node in candidates] == ["candidate 0 {'max_depth': 2}", "candidate 1 {'max_depth': 4}",
+                                                     'refit']
+    assert len(candidates[0]['attributes']['fold_test_scores']) == 3
+    assert candidates[0]['wall_seconds'] == pytest.approx(
+        3 * (search.cv_results_['mean_fit_time'][0] + search.cv_results_['mean_score_time'][0]))
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.pipeline import Pipeline
+from backends import model_steps
+from sharding import ShardedRegressor
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'Store': rng.integers(1, 5, size=400), 'a': rng.normal(size=400), 'b': rng.normal(size=400)})
+    # every store has its own slope, so one model per store fits it exactly
+    y = X['Store'] * 10 * X['a'] + X['b'] + rng.normal(scale=0.01, size=len(X))
+    return X, y
+
+
+def shard_model(X, y):
+    return Pipeline(model_steps('linear')).fit(X.to_numpy(dtype=np.float64), y)
+
+
+def test_every_shard_predicts_like_a_model_fit_on_its_rows(data):
+    X, y = data
+    sharded = ShardedRegressor('linear', n_jobs=1).fit(X, y)
+    assert sorted(sharded.models_) == [1, 2, 3, 4]
+    y_pred = sharded.predict(X)
+    for store in [1, 2, 3, 4]:
+        rows = (X['Store'] == store).to_numpy()
+        np.testing.assert_allclose(y_pred[rows], shard_model(X[rows], y[rows]).predict(X[rows].to_numpy(dtype=np.float64)))
+
+
+def test_stores_are_grouped_by_the_shard_mapping(data):
+    X, y = data
+    # store 4 has no shard: its rows are not used for training and are predicted as the average
+    shards = {1: 'small', 2: 'small', 3: 'large'}
+    sharded = ShardedRegressor('linear', shards=shards, n_jobs=1).fit(X, y)
+    assert sorted(sharded.models_) == ['large', 'small']
+    y_pred = sharded.predict(X)
+    small = X['Store'].isin([1, 2]).to_numpy()
+    np.testing.assert_allclose(y_pred[small], shard_model(X[small], y[small]).predict(X[small].to_numpy(dtype=np.float64)))
+    np.testing.assert_array_equal(y_pred[(X['Store'] == 4).to_numpy()], np.mean(y))
+
+
+def test_refit_shards_keeps_the_other_shards(data):
+    X, y = data
+    sharded = ShardedRegressor('linear', n_jobs=1).fit(X, y)
+    kept = sharded.models_[2]
+    store_one = (X['Store'] == 1).to_numpy()
+    sharded.refit_shards(X[store_one], -y[store_one])
+    assert sharded.models_[2] is kept
+    refreshed = shard_model(X[store_one], -y[store_one]).predict(X[store_one].to_numpy(dtype=np.float64))
+    np.testing.assert_allclose(sharded.predict(X[store_one]), refreshed)
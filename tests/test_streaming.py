@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.linear_model import LinearRegression, SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from pipeline_steps import CategoricalToNumerical, FeatureExtractor
+from streaming import FillMissing, ScaledTargetRegressor, StoreSales, fit_streaming
+from synthetic_data import SyntheticRossmann
+
+
+@pytest.fixture(scope='module')
+def train():
+    return SyntheticRossmann(n_stores=6, start='2014-11-01', end='2015-03-31', test_days=0, seed=4).train_frame()
+
+
+def chunks(frame, n_chunks=4):
+    size = -(-len(frame) // n_chunks)
+    return [frame.iloc[start:start + size] for start in range(0, len(frame), size)]
+
+
+def features(train):
+    return train.drop(columns=['Sales', 'Customers'])
+
+
+def test_preprocessing_learned_in_chunks_is_the_one_learned_at_once(train):
+    X = features(train)
+    encoder, extractor = CategoricalToNumerical(drop_missing=True), FeatureExtractor()
+    chunked_encoder, chunked_extractor = CategoricalToNumerical(drop_missing=True), FeatureExtractor()
+    for chunk in chunks(X):
+        chunked_encoder.partial_fit(chunk)
+        chunked_extractor.partial_fit(chunk)
+    expected = extractor.fit(X).transform(encoder.fit(X).transform(X.copy()))
+    result = chunked_extractor.transform(chunked_encoder.transform(X.copy()))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_fill_missing_learned_in_chunks():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(500, 3))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    fill = FillMissing()
+    for start in range(0, len(values), 128):
+        fill.partial_fit(values[start:start + 128])
+    np.testing.assert_allclose(fill.means_, np.nanmean(values, axis=0))
+    np.testing.assert_allclose(fill.transform(values), FillMissing().fit(values).transform(values))
+    assert not np.isnan(fill.transform(values)).any()
+
+
+def test_store_sales_learned_in_chunks(train):
+    X = CategoricalToNumerical(drop_missing=True).fit_transform(features(train))
+    y = train['Sales'].loc[X.index]
+    folds = np.random.default_rng(0).integers(5, size=len(X))
+    store_sales = StoreSales()
+    for chunk in chunks(pd.DataFrame({'fold': folds}, index=X.index).join(X)):
+        store_sales.partial_fit(chunk.drop(columns=['fold']), y.loc[chunk.index], chunk['fold'])
+    expected = StoreSales().fit(X, y, folds)
+    np.testing.assert_array_equal(store_sales.stores_, expected.stores_)
+    np.testing.assert_allclose(store_sales.sums_, expected.sums_)
+
+    levels = store_sales.transform(X.copy())
+    open_sales = y[X['Open'] == 1].groupby(X['Store']).mean()
+    np.testing.assert_allclose(levels['StoreSales'], X['Store'].map(open_sales))
+    assert 'Store' not in levels
+
+
+def test_store_sales_out_of_fold_leave_the_row_fold_out(train):
+    X = CategoricalToNumerical(drop_missing=True).fit_transform(features(train))
+    y = train['Sales'].loc[X.index]
+    folds = np.random.default_rng(0).integers(5, size=len(X))
+    levels = StoreSales().fit(X, y, folds).transform_out_of_fold(X.copy(), folds)
+    is_open = X['Open'] == 1
+    for fold in range(5):
+        other = is_open & (folds != fold)
+        expected = y[other].groupby(X['Store'][other]).mean()
+        rows = folds == fold
+        np.testing.assert_allclose(levels['StoreSales'][rows], X['Store'][rows].map(expected))
+
+
+def test_scaled_target_regressor_predicts_in_the_target_units():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 3))
+    y = 5000 + 800 * X[:, 0] - 300 * X[:, 1] + rng.normal(scale=10, size=len(X))
+    model = ScaledTargetRegressor(LinearRegression()).fit(X, y)
+    expected = TransformedTargetRegressor(LinearRegression(), transformer=StandardScaler()).fit(X, y)
+    np.testing.assert_allclose(model.predict(X), expected.predict(X))
+
+    chunked = ScaledTargetRegressor(SGDRegressor(random_state=0))
+    for start in range(0, len(y), 100):
+        chunked.partial_fit_target(y[start:start + 100])
+    np.testing.assert_allclose(chunked.target_scaler_.mean_, [y.mean()])
+    for _ in range(5):
+        for start in range(0, len(y), 100):
+            chunked.partial_fit(X[start:start + 100], y[start:start + 100])
+    assert np.abs(chunked.predict(X) - y).mean() < 50
+
+
+def test_fit_streaming_trains_on_the_days_before_the_held_out_ones(tmp_path):
+    path = SyntheticRossmann(n_stores=6, start='2014-11-01', end='2015-03-31', test_days=0, seed=4).write(
+        str(tmp_path))['train']
+    pipeline, metrics = fit_streaming(path, 'sgd', chunk_size=200, epochs=2, validation_days=14)
+    assert metrics['rows'] == 6 * 14
+    assert metrics['r2'] > 0.5
+    assert [name for name, _ in pipeline.steps][-3:] == ['store_sales', 'scaler', 'model']